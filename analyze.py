@@ -0,0 +1,269 @@
+import argparse
+import binascii
+import concurrent.futures
+import mmap
+import os
+
+from comm import Comm, CommError, CommStartError, FrameDecoder
+from capture import CaptureReader, _MAGIC, _HEADER, _ERRORS
+from hexdump import hexdump, strdump
+from metrics import Histogram
+from packet import PacketSchema
+
+_CHUNK = 16 * 1024 * 1024
+_FRAME_MAX = 4 + 0xffff
+_HITS = 100
+_VALUES = 1000
+_SAMPLE = 4096
+_RESYNC = 8
+_ENCODING = "euc-kr"
+
+
+def parse_schema(text):
+    # comma separated key:width, key:width:raw to read through separators, or $xx to skip to a separator
+    fields = []
+    for item in text.split(","):
+        item = item.strip()
+        if item.startswith("$"):
+            fields.append(int(item[1:], 16))
+            continue
+        key, width, *flags = item.split(":")
+        if flags and flags != ["raw"]:
+            raise ValueError(f"bad schema field: {item}")
+        fields.append((key, int(width), False) if flags else (key, int(width)))
+    return fields
+
+
+class Stats(object):
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.discarded = 0
+        self.errors = {}
+        self.fields = {}
+        self.sizes = {}
+        self.latency = Histogram()
+        self.hits = []
+        self.samples = []
+        self.first = None
+        self.last = None
+
+    def count(self, key, value, count=1):
+        values = self.fields.setdefault(key, {})
+        if value not in values and len(values) >= _VALUES:
+            value = None
+        values[value] = values.get(value, 0) + count
+
+    def add_error(self, name, offset, raw):
+        self.errors[name] = self.errors.get(name, 0) + 1
+        if len(self.samples) < _HITS:
+            self.samples.append((offset, name, bytes(raw or b'')[:_SAMPLE]))
+
+    def add(self, item, offset, schema, pattern):
+        self.frames += 1
+        self.bytes += len(item)
+        for key, value in schema.parse(Comm.parse(item)).items():
+            self.count(key, bytes(value))
+        bucket = len(item).bit_length()
+        self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+        if pattern and pattern in item and len(self.hits) < _HITS:
+            self.hits.append((offset, "hit", bytes(item[:_SAMPLE])))
+
+    def merge(self, other):
+        self.frames += other.frames
+        self.bytes += other.bytes
+        self.discarded += other.discarded
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+        for key, values in other.fields.items():
+            for value, count in values.items():
+                self.count(key, value, count)
+        for bucket, count in other.sizes.items():
+            self.sizes[bucket] = self.sizes.get(bucket, 0) + count
+        self.latency.merge(other.latency)
+        self.hits.extend(other.hits[:_HITS - len(self.hits)])
+        self.samples.extend(other.samples[:_HITS - len(self.samples)])
+        return self
+
+
+def analyze_stream(filename, start, end, fields, fs=[], pattern=None, synced=False):
+    stats = Stats()
+    schema = PacketSchema(fields, fs)
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            stop = min(len(mm), end + _FRAME_MAX)
+            at_eof = stop == len(mm)
+            decoder = FrameDecoder(True)
+            decoder.feed(mm[start: stop])
+        finally:
+            mm.close()
+
+    while start + decoder.pos < end:
+        item = decoder.next()
+        if item is None:
+            if not at_eof or len(decoder) == 0:
+                break
+            # a frame cut off by the end of the dump; resync after its STX
+            item = decoder.skip()
+
+        if isinstance(item, CommStartError):
+            if synced or stats.first is not None:
+                stats.discarded += min(start + decoder.pos, end) - (start + decoder.pos - len(item.raw))
+            continue
+
+        if isinstance(item, CommError):
+            if start + decoder.pos - 1 >= end:
+                break
+            if synced or stats.first is not None:
+                stats.add_error(type(item).__name__, start + decoder.pos - 1, item.raw)
+            continue
+
+        offset = start + decoder.pos - len(item)
+        if offset >= end:
+            break
+        if stats.first is None:
+            stats.first = offset
+        stats.last = start + decoder.pos
+        stats.add(item, offset, schema, pattern)
+
+    return stats
+
+
+def record_end(mm, pos, strict=False):
+    if pos + _HEADER.size > len(mm):
+        return None
+    ts, direction, code, name_len, raw_len = _HEADER.unpack_from(mm, pos)
+    if strict and (direction not in b'<>' or code >= len(_ERRORS) or not 0 < ts < 1e10):
+        return None
+    end = pos + _HEADER.size + name_len + raw_len
+    return end if end <= len(mm) else None
+
+
+def resync(mm, pos, end):
+    # a record boundary is where _RESYNC plausible headers chain up, or the chain ends at eof
+    while pos < end:
+        chain = pos
+        for n in range(_RESYNC):
+            chain = record_end(mm, chain, True)
+            if chain is None or chain == len(mm):
+                break
+        if chain is not None:
+            return pos
+        pos += 1
+    return pos
+
+
+def analyze_capture(filename, start, end, fields, fs=[], pattern=None, synced=False):
+    stats = Stats()
+    schema = PacketSchema(fields, fs)
+    sent = {}
+    with CaptureReader(filename, index=False) as reader:
+        pos = start if synced else resync(reader.mm, start, end)
+        stats.first = pos
+        while pos < end:
+            next_pos = record_end(reader.mm, pos)
+            if next_pos is None:
+                break
+            record = reader.record(pos)
+            if record.direction == '>':
+                sent[record.port] = record.ts
+            elif record.error:
+                stats.add_error(record.error, pos, record.raw)
+            else:
+                if record.port in sent:
+                    stats.latency.add(record.ts - sent.pop(record.port))
+                stats.add(record.raw, pos, schema, pattern)
+            pos = next_pos
+        stats.last = pos
+    return stats
+
+
+def analyze(filename, jobs=None, chunk=_CHUNK, fields=[("type", 1)], fs=[], pattern=None):
+    jobs = jobs or os.cpu_count() or 1
+    with open(filename, 'rb') as f:
+        is_capture = f.read(len(_MAGIC)) == _MAGIC
+
+    size = os.path.getsize(filename)
+    first = len(_MAGIC) if is_capture else 0
+    ranges = [(start, min(size, start + chunk)) for start in range(first, size, chunk)]
+
+    total = Stats()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        if is_capture:
+            futures = [pool.submit(analyze_capture, filename, start, end, fields, fs, pattern, start == first)
+                       for start, end in ranges]
+
+            # chunks resync on their own; a chunk that landed off the previous chunk's last record is redone
+            last = first
+            for (start, end), future in zip(ranges, futures):
+                stats = future.result()
+                if last >= end:
+                    continue
+                if stats.first != last:
+                    stats = analyze_capture(filename, last, end, fields, fs, pattern, True)
+                total.merge(stats)
+                last = stats.last
+            return total
+
+        futures = [pool.submit(analyze_stream, filename, start, end, fields, fs, pattern, start == 0)
+                   for start, end in ranges]
+
+        # chunks sync on their first valid frame; fix up the seams against the previous chunk
+        last = 0
+        for (start, end), future in zip(ranges, futures):
+            stats = future.result()
+            if last >= end:
+                continue
+            if stats.first is not None and stats.first > last:
+                gap = analyze_stream(filename, last, stats.first, fields, fs, pattern, True)
+                if gap.last is None or gap.last <= stats.first:
+                    total.merge(gap)
+                    last = stats.first
+            if stats.first != last:
+                stats = analyze_stream(filename, last, end, fields, fs, pattern, True)
+            total.merge(stats)
+            last = max(end, stats.last or end)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="analyze a raw byte dump or a capture file on all cores")
+    parser.add_argument("filename")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=_CHUNK, help="file bytes per job")
+    parser.add_argument("--type-width", type=int, default=1, help="leading data bytes that name the message type")
+    parser.add_argument("--schema", help="fields to count, e.g. type:2,$1c,code:4 (key:width:raw reads through separators)")
+    parser.add_argument("--fs", default="1c", help="hex separator bytes for --schema")
+    parser.add_argument("--search", help="hex pattern to look for in frames")
+    parser.add_argument("--show", type=int, default=10, help="errors and hits to dump")
+    args = parser.parse_args()
+
+    fields = parse_schema(args.schema) if args.schema else [("type", args.type_width)]
+    fs = list(binascii.unhexlify(args.fs)) if args.schema else []
+    pattern = binascii.unhexlify(args.search.replace(' ', '')) if args.search else None
+    stats = analyze(args.filename, args.jobs, args.chunk, fields, fs, pattern)
+
+    print(f"frames {stats.frames}, bytes {stats.bytes}, skipped {stats.discarded}")
+    print(f"errors {stats.errors}")
+    for key in PacketSchema(fields, fs).keys():
+        print(f"{key}:")
+        values = stats.fields.get(key, {})
+        for value, count in sorted(values.items(), key=lambda item: -item[1])[:20]:
+            if value is None:
+                print(f"  {'(other)':<20s} {'':<20s} {count}")
+            else:
+                print(f"  {value.hex().upper() or '-':<20s} {strdump(value, _ENCODING):<20s} {count}")
+    for bucket, count in sorted(stats.sizes.items()):
+        print(f"  size < {1 << bucket:<6d} {count}")
+    if stats.latency.count:
+        print(f"latency {stats.latency.summary()}")
+
+    samples = stats.samples[:args.show]
+    if pattern:
+        print(f"hits {len(stats.hits)}{'+' if len(stats.hits) >= _HITS else ''}")
+        samples += stats.hits[:args.show]
+    for offset, kind, raw in samples:
+        print(f"{kind} at {offset:#x}, {len(raw)} bytes")
+        print(hexdump(raw))
+        print(strdump(raw, _ENCODING))
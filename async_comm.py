@@ -0,0 +1,226 @@
+import asyncio
+import binascii
+import os
+
+from comm import Comm, CommError, CommClosedError, CommLengthError, CommTimeoutError, FrameDecoder
+from comm import _TIMEOUT, _FRAME_TIMEOUT
+
+_POLL = 0.005
+_HIGH_WATER = 65536
+
+
+class AsyncComm(object):
+    def __init__(self, port, speed=38400, start_error=False, comm=None):
+        self.comm = comm if comm else Comm(port, speed)
+        self.decoder = FrameDecoder(start_error)
+        self.frames = None
+        self.loop = None
+        self.fd = None
+        self.poll_task = None
+        self.frame_timer = None
+        self.blocking = None
+        self.out = bytearray()
+        self.drained = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.frames.get()
+        if item is None:
+            self.frames.put_nowait(None)
+            raise StopAsyncIteration
+        return item
+
+    @property
+    def is_open(self):
+        return self.loop is not None
+
+    async def open(self):
+        if self.loop:
+            return
+
+        self.comm.open()
+        self.comm.ser.timeout = 0
+        self.loop = asyncio.get_event_loop()
+        self.frames = asyncio.Queue()
+        try:
+            self.fd = self.comm.ser.fileno()
+            self.loop.add_reader(self.fd, self.on_readable)
+            self.blocking = os.get_blocking(self.fd)
+            os.set_blocking(self.fd, False)
+        except Exception:
+            self.fd = None
+            if hasattr(self.comm.ser, "write_timeout"):
+                self.comm.ser.write_timeout = 0
+            self.poll_task = self.loop.create_task(self.run_poll())
+
+    def close(self):
+        if not self.loop:
+            return
+
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            if self.out:
+                self.loop.remove_writer(self.fd)
+            if self.blocking is not None:
+                os.set_blocking(self.fd, self.blocking)
+                self.blocking = None
+            self.fd = None
+        if self.poll_task:
+            self.poll_task.cancel()
+            self.poll_task = None
+        if self.frame_timer:
+            self.frame_timer.cancel()
+            self.frame_timer = None
+
+        self.out.clear()
+        self.on_drained()
+        self.comm.close()
+        self.loop = None
+        self.frames.put_nowait(None)
+
+    def on_readable(self):
+        try:
+            raw = self.comm.ser.read(self.comm.ser.in_waiting or 1)
+        except Exception as ex:
+            print(f"on_readable: {ex}")
+            self.close()
+            return
+        self.on_data(raw)
+
+    async def run_poll(self):
+        while True:
+            if self.out:
+                self.on_writable()
+            if self.comm.ser.in_waiting:
+                self.on_data(self.comm.ser.read(self.comm.ser.in_waiting))
+            else:
+                await asyncio.sleep(_POLL)
+
+    def on_data(self, raw):
+        metrics = self.comm.metrics
+        if metrics:
+            metrics.count_read(len(raw))
+        for item in self.decoder.feed(raw):
+            if metrics:
+                metrics.count_in(item)
+            self.frames.put_nowait(item)
+        if metrics:
+            metrics.discarded = self.decoder.discarded
+
+        if self.frame_timer:
+            self.frame_timer.cancel()
+            self.frame_timer = None
+        if len(self.decoder) > 0:
+            self.frame_timer = self.loop.call_later(_FRAME_TIMEOUT, self.on_frame_timeout)
+
+    def on_frame_timeout(self):
+        self.frame_timer = None
+        ex = CommLengthError("Length Error", self.decoder.flush())
+        if self.comm.metrics:
+            self.comm.metrics.count_in(ex)
+        self.frames.put_nowait(ex)
+
+    def write_some(self, dat):
+        if self.fd is None:
+            size = self.comm.ser.write(dat)
+            return len(dat) if size is None else size
+        try:
+            return os.write(self.fd, dat)
+        except BlockingIOError:
+            return 0
+
+    def on_writable(self):
+        try:
+            del self.out[:self.write_some(self.out)]
+        except Exception as ex:
+            print(f"on_writable: {ex}")
+            self.close()
+            return
+        if not self.out:
+            if self.fd is not None:
+                self.loop.remove_writer(self.fd)
+            self.on_drained()
+
+    def on_drained(self):
+        if self.drained and not self.drained.done():
+            self.drained.set_result(None)
+        self.drained = None
+
+    def write_nowait(self, raw):
+        # never blocks the loop: what the port does not take now is sent when it becomes writable
+        if not self.loop:
+            raise CommClosedError("Closed Error", raw)
+        if self.comm.metrics:
+            self.comm.metrics.count_out(raw)
+        if self.out:
+            self.out += raw
+            return
+
+        size = self.write_some(raw)
+        if size < len(raw):
+            self.out += raw[size:]
+            if self.fd is not None:
+                self.loop.add_writer(self.fd, self.on_writable)
+
+    async def drain(self):
+        while self.out and self.loop:
+            if self.drained is None:
+                self.drained = self.loop.create_future()
+            await self.drained
+
+    async def write(self, raw):
+        self.write_nowait(raw)
+        if len(self.out) > _HIGH_WATER:
+            await self.drain()
+        else:
+            await asyncio.sleep(0)
+
+    async def read(self, timeout=_TIMEOUT):
+        if not self.loop and self.frames is None:
+            raise CommClosedError("Closed Error", None)
+
+        try:
+            item = await asyncio.wait_for(self.frames.get(), timeout)
+        except asyncio.TimeoutError:
+            ex = CommTimeoutError("Timeout Error", None)
+            if self.comm.metrics:
+                self.comm.metrics.count_in(ex)
+            raise ex
+
+        if item is None:
+            self.frames.put_nowait(None)
+            raise CommClosedError("Closed Error", None)
+        if isinstance(item, CommError):
+            raise item
+        return item
+
+    async def send(self, dat):
+        await self.write(Comm.build(dat))
+
+    async def recv(self, timeout=_TIMEOUT):
+        return Comm.parse(await self.read(timeout))
+
+
+if __name__ == '__main__':
+    async def echo(port, speed):
+        async with AsyncComm(port, speed) as comm:
+            async for raw in comm:
+                if isinstance(raw, CommError):
+                    print(str(raw))
+                    continue
+                print(binascii.hexlify(raw))
+                await comm.write(raw)
+
+    try:
+        asyncio.get_event_loop().run_until_complete(echo('/dev/pts/2', 38400))
+    except KeyboardInterrupt:
+        pass
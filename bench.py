@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from comm import Comm, CommError, CommTimeoutError, FrameDecoder
+from packet import PacketBuilder
+from transport import LoopbackTransport
+import hexdump
+
+_SIZES = [16, 256, 4096, 65000]
+_SPEEDS = [38400, 115200]
+_DURATION = 0.5
+_TOLERANCE = 0.2
+
+
+def measure(func, duration=_DURATION):
+    count = 0
+    cpu = time.process_time()
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+    return count / elapsed, (time.process_time() - cpu) / count
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * pct // 100)] if values else 0
+
+
+def bench_hot_paths(sizes):
+    out = {}
+    for size in sizes:
+        dat = bytes(range(32, 127)) * (size // 95 + 1)
+        dat = dat[:size]
+        raw = Comm.build(dat)
+        stream = (b'\xff' + raw) * max(1, 65536 // len(raw))
+        count = stream.count(raw)
+        text = dat.replace(b'$', b'$$').replace(b'\x1c', b'$1c')
+
+        def decode():
+            for item in FrameDecoder().feed(stream):
+                pass
+
+        def dump():
+            hexdump._hexdump.cache_clear()
+            hexdump._strdump.cache_clear()
+            hexdump.hexdump(raw)
+            hexdump.strdump(raw, "euc-kr")
+
+        for name, func, frames in (("calc_lrc", lambda: Comm.calc_lrc(raw), 1),
+                                   ("build", lambda: Comm.build(dat), 1),
+                                   ("decode", decode, count),
+                                   ("packet", lambda: PacketBuilder().decode(text).build(), 1),
+                                   ("hexdump", dump, 1)):
+            rate, cpu = measure(func)
+            out[f"{name}/{size}"] = {
+                "frames_s": rate * frames,
+                "bytes_s": rate * frames * len(raw),
+                "cpu_frame_us": cpu / frames * 1e6,
+            }
+    return out
+
+
+def run_echo(fd, running):
+    while running.is_set():
+        try:
+            dat = os.read(fd, 65536)
+        except OSError:
+            break
+        if dat:
+            os.write(fd, dat)
+
+
+def run_loopback_echo(comm, running):
+    while running.is_set():
+        try:
+            comm.write(comm.read(0.1))
+        except CommTimeoutError:
+            pass
+
+
+def round_trips(comm, size, duration):
+    dat = b'\x55' * size
+    latency = []
+    cpu = time.process_time()
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        sent = time.perf_counter()
+        comm.send(dat)
+        comm.recv(3)
+        latency.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - start
+    frames = len(latency)
+    return {
+        "frames_s": frames / elapsed,
+        "bytes_s": frames * (size + 5) / elapsed,
+        "p50_us": percentile(latency, 50) * 1e6,
+        "p99_us": percentile(latency, 99) * 1e6,
+        "cpu_frame_us": (time.process_time() - cpu) / max(1, frames) * 1e6,
+    }
+
+
+def bench_loopback(sizes, duration):
+    out = {}
+    a, b = LoopbackTransport.pair()
+    comm = Comm("loopback", transport=a)
+    peer = Comm("peer", transport=b)
+    comm.open()
+    peer.open()
+    running = threading.Event()
+    running.set()
+    thread = threading.Thread(target=run_loopback_echo, args=(peer, running), daemon=True)
+    thread.start()
+    try:
+        for size in sizes:
+            out[f"loopback/{size}"] = round_trips(comm, size, duration)
+    finally:
+        running.clear()
+        thread.join()
+    return out
+
+
+def bench_pty(sizes, speeds, duration):
+    out = {}
+    master, slave = os.openpty()
+    running = threading.Event()
+    running.set()
+    thread = threading.Thread(target=run_echo, args=(master, running), daemon=True)
+    thread.start()
+    try:
+        for speed in speeds:
+            comm = Comm(os.ttyname(slave), speed)
+            comm.open()
+            try:
+                for size in sizes:
+                    out[f"pty/{speed}/{size}"] = round_trips(comm, size, duration)
+            finally:
+                comm.close()
+    finally:
+        running.clear()
+        os.close(slave)
+        os.close(master)
+    return out
+
+
+def compare(result, baseline):
+    regressed = []
+    for name, cur in sorted(result.items()):
+        old = baseline.get(name)
+        if not old:
+            continue
+        ratio = cur["frames_s"] / old["frames_s"] if old["frames_s"] else 0
+        flag = ""
+        if ratio < 1 - _TOLERANCE:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<24s} {old['frames_s']:14.1f} -> {cur['frames_s']:14.1f} frames/s  x{ratio:.2f}{flag}")
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="comm framing and transport benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=_SIZES)
+    parser.add_argument("--speeds", type=int, nargs="+", default=_SPEEDS)
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per transport case")
+    parser.add_argument("--no-pty", action="store_true", help="skip the pty round trip cases")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline, exit 1 on regression")
+    args = parser.parse_args()
+
+    result = bench_hot_paths(args.sizes)
+    result.update(bench_loopback(args.sizes, args.duration))
+    if not args.no_pty and hasattr(os, "openpty"):
+        try:
+            result.update(bench_pty(args.sizes, args.speeds, args.duration))
+        except (OSError, CommError) as ex:
+            print(f"pty: {ex}", file=sys.stderr)
+
+    for name, val in sorted(result.items()):
+        print(f"{name:<24s} " + "  ".join(f"{k} {v:.1f}" for k, v in val.items()))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(result, json.load(f)):
+                sys.exit(1)
@@ -0,0 +1,167 @@
+import array
+import binascii
+import bisect
+import collections
+import mmap
+import os
+import struct
+import sys
+import time
+
+from comm import CommError, CommStartError, CommLengthError, CommDataError, CommTimeoutError
+
+_MAGIC = b'COMMCAP1'
+_HEADER = struct.Struct('<dBBBI')
+
+_ERRORS = (None, CommStartError, CommLengthError, CommDataError, CommTimeoutError)
+
+CaptureRecord = collections.namedtuple("CaptureRecord", ["ts", "port", "direction", "error", "raw"])
+
+
+def sender(record):
+    if record.error:
+        return "<" + record.error[4]
+    return "<<" if record.direction == "<" else ">>"
+
+
+class CaptureWriter(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = open(filename, 'ab')
+        if self.f.tell() == 0:
+            self.f.write(_MAGIC)
+        self.ports = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def flush(self):
+        self.f.flush()
+
+    def write(self, port, direction, raw, error=None, ts=None):
+        name = self.ports.get(port)
+        if name is None:
+            name = self.ports[port] = port.encode()[:255]
+        code = _ERRORS.index(type(error)) if error else 0
+        raw = raw or b''
+        self.f.write(_HEADER.pack(time.time() if ts is None else ts,
+                                  ord(direction), code, len(name), len(raw)))
+        self.f.write(name)
+        self.f.write(raw)
+
+    def write_item(self, port, item, ts=None):
+        if isinstance(item, CommError):
+            self.write(port, '<', item.raw, item, ts)
+        else:
+            self.write(port, '<', item, None, ts)
+
+
+class CaptureReader(object):
+    def __init__(self, filename, index=True):
+        self.filename = filename
+        self.f = open(filename, 'rb')
+        self.mm = None
+        self.size = 0
+        self.offsets = array.array('Q')
+        self.stamps = array.array('d')
+        if index:
+            self.refresh()
+        else:
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return self.record(self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield self.record(offset)
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+        if self.f:
+            self.f.close()
+            self.f = None
+
+    def refresh(self):
+        size = os.fstat(self.f.fileno()).st_size
+        if size <= self.size:
+            return 0
+        if self.mm:
+            self.mm.close()
+        self.mm = mmap.mmap(self.f.fileno(), size, access=mmap.ACCESS_READ)
+
+        if self.size == 0:
+            if self.mm[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f"{self.filename}: not a capture file")
+            pos = len(_MAGIC)
+        else:
+            pos = self.size
+
+        count = len(self.offsets)
+        unpack = _HEADER.unpack_from
+        while pos + _HEADER.size <= size:
+            ts, direction, code, name_len, raw_len = unpack(self.mm, pos)
+            end = pos + _HEADER.size + name_len + raw_len
+            if end > size:
+                break
+            self.offsets.append(pos)
+            self.stamps.append(ts)
+            pos = end
+        self.size = pos
+        return len(self.offsets) - count
+
+    def record(self, offset):
+        ts, direction, code, name_len, raw_len = _HEADER.unpack_from(self.mm, offset)
+        pos = offset + _HEADER.size
+        port = self.mm[pos: pos + name_len].decode()
+        pos += name_len
+        error = _ERRORS[code].__name__ if code else None
+        return CaptureRecord(ts, port, chr(direction), error, self.mm[pos: pos + raw_len])
+
+    def scan(self, pos, end):
+        end = min(end, len(self.mm))
+        while pos + _HEADER.size <= end:
+            ts, direction, code, name_len, raw_len = _HEADER.unpack_from(self.mm, pos)
+            if pos + _HEADER.size + name_len + raw_len > len(self.mm):
+                break
+            yield self.record(pos)
+            pos += _HEADER.size + name_len + raw_len
+
+    def select(self, start=None, end=None, direction=None, port=None, error=None):
+        first = 0 if start is None else bisect.bisect_left(self.stamps, start)
+        last = len(self.stamps) if end is None else bisect.bisect_left(self.stamps, end)
+        for index in range(first, last):
+            record = self.record(self.offsets[index])
+            if direction and record.direction != direction:
+                continue
+            if port and record.port != port:
+                continue
+            if error is not None and record.error != (error or None):
+                continue
+            yield record
+
+
+if __name__ == '__main__':
+    with CaptureReader(sys.argv[1]) as reader:
+        for record in reader:
+            ts = time.strftime("%H:%M:%S", time.localtime(record.ts)) + f".{int(record.ts * 1000) % 1000:03d}"
+            print(f"[{ts}] {record.port} {sender(record)} {binascii.hexlify(record.raw).decode().upper()}")
@@ -0,0 +1,178 @@
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+
+_EXIT_OK = 0
+_EXIT_ERROR = 1
+_EXIT_TIMEOUT = 2
+_EXIT_INTERRUPT = 130
+
+_ENCODING = "euc-kr"
+_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.csv")
+
+
+class Cli(object):
+    def __init__(self, args):
+        from comm import Comm
+
+        self.args = args
+        self.comm = Comm(args.port, args.speed)
+        self.capture = None
+        self.preset = None
+        self.received = 0
+        self.errors = 0
+        self.error = None
+        self.done = threading.Event()
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def format(ts, sender, raw):
+        # like LogBuffer.format but never cut, stdout is meant to be parsed
+        ts = datetime.datetime.fromtimestamp(ts).strftime("%H:%M:%S.%f")[:-3]
+        return f"[{ts}] {sender} {raw.hex().upper()}"
+
+    def output(self, sender, raw, error=None):
+        ts = time.time()
+        with self.lock:
+            if not self.args.quiet:
+                print(self.format(ts, sender, raw or b''), flush=True)
+            if self.capture:
+                self.capture.write(self.args.port, sender[0], raw, error, ts)
+
+    def open(self):
+        if self.args.capture:
+            from capture import CaptureWriter
+            self.capture = CaptureWriter(self.args.capture)
+        if self.args.preset or self.args.stdin:
+            from preset import PresetStore
+            self.preset = PresetStore(self.args.csv, _ENCODING)
+            if self.args.preset or os.path.exists(self.args.csv):
+                self.preset.load()
+            for key in self.args.preset or []:
+                if key not in self.preset.keys():
+                    raise ValueError(f"unknown preset {key!r} in {self.args.csv}")
+
+        if self.args.stats:
+            from metrics import Metrics
+            self.comm.metrics = Metrics()
+            threading.Thread(target=self.run_stats_thread, daemon=True).start()
+
+        self.comm.open()
+        if self.comm.peer_name:
+            print(f"{self.args.port}: peer {self.comm.peer_name}", file=sys.stderr, flush=True)
+        self.running = True
+        self.thread = threading.Thread(target=self.run_comm_thread, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.comm.close()
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+
+    def run_comm_thread(self):
+        from comm import CommError, CommTimeoutError
+
+        while self.running:
+            try:
+                raw = self.comm.read(0.1, True)
+                self.received += 1
+                self.output("<<", raw)
+                if self.args.expect and self.received >= self.args.expect:
+                    self.done.set()
+            except CommTimeoutError:
+                pass
+            except CommError as ex:
+                self.errors += 1
+                self.output("<" + str(ex)[0], ex.raw, ex)
+            except Exception as ex:
+                print(f"run_comm_thread: {ex}", file=sys.stderr)
+                self.error = ex
+                self.done.set()
+                break
+
+    def run_stats_thread(self):
+        while not self.done.wait(self.args.stats):
+            print(self.comm.metrics.format(), file=sys.stderr, flush=True)
+
+    def send(self, text):
+        if text in self.preset.preset:
+            raw = self.preset.get(text).build()
+        else:
+            raw = self.preset.compile(text).build()
+        self.comm.write(raw)
+        self.output(">>", raw)
+
+    def run(self):
+        if self.args.preset:
+            count = 0
+            while not self.args.count or count < self.args.count:
+                for key in self.args.preset:
+                    self.send(key)
+                count += 1
+                if self.done.wait(self.args.interval):
+                    break
+
+        if self.args.stdin:
+            for line in sys.stdin:
+                line = line.rstrip('\r\n')
+                if line:
+                    self.send(line)
+                if self.done.is_set():
+                    break
+
+        # a finished send script ends the run, a pure listener waits until stopped
+        if self.args.duration is not None or self.args.expect or not (self.args.preset or self.args.stdin):
+            self.done.wait(self.args.duration)
+
+        if self.error:
+            return _EXIT_ERROR
+        if self.args.expect and self.received < self.args.expect:
+            return _EXIT_TIMEOUT
+        return _EXIT_OK
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="headless comm test")
+    parser.add_argument("port")
+    parser.add_argument("--speed", type=int, default=38400)
+    parser.add_argument("--csv", default=_CSV, help="preset file (default: main.csv next to this script)")
+    parser.add_argument("--preset", action="append", help="preset to send, may be repeated")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between preset rounds")
+    parser.add_argument("--count", type=int, default=1, help="preset rounds, 0 = forever")
+    parser.add_argument("--stdin", action="store_true", help="send preset names or $xx text read from stdin")
+    parser.add_argument("--capture", help="append all traffic to this capture file")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="seconds to keep reading after sending "
+                             "(default: stop once sending is done, or run forever when only listening)")
+    parser.add_argument("--expect", type=int, default=0, help="exit as soon as this many frames are received")
+    parser.add_argument("--quiet", action="store_true", help="do not print frames")
+    parser.add_argument("--stats", type=float, default=0, help="seconds between metrics lines on stderr")
+    args = parser.parse_args(argv)
+
+    cli = None
+    try:
+        cli = Cli(args)
+        cli.open()
+        return cli.run()
+    except KeyboardInterrupt:
+        return _EXIT_INTERRUPT
+    except Exception as ex:
+        print(f"{args.port}: {ex}", file=sys.stderr)
+        return _EXIT_ERROR
+    finally:
+        if cli:
+            cli.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,15 @@
 import serial
 import serial.tools.list_ports
 import binascii
+import time
 
 _STX = 0x02
 _ETX = 0x03
 
 _TIMEOUT = 1
+_FRAME_TIMEOUT = 3
+# fixed port timeout; read() enforces its own deadlines on the monotonic clock
+_READ_POLL = 0.01
 
 
 class CommError(Exception):
@@ -30,12 +34,121 @@ class CommDataError(CommError):
     pass
 
 
+class CommClosedError(CommError):
+    pass
+
+
+class CommBusyError(CommError):
+    pass
+
+
+class FrameDecoder(object):
+    def __init__(self, start_error=False, max_len=0xffff):
+        self.buf = bytearray()
+        self.pos = 0
+        self.start_error = start_error
+        self.max_len = max_len
+        self.discarded = 0
+
+    def __len__(self):
+        return len(self.buf) - self.pos
+
+    def feed(self, dat):
+        if self.pos > 0 and self.pos * 2 >= len(self.buf):
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += dat
+        return self.decode()
+
+    def decode(self):
+        while True:
+            item = self.next()
+            if item is None:
+                return
+            yield item
+
+    def next(self):
+        buf = self.buf
+        pos = self.pos
+        if pos >= len(buf):
+            return None
+
+        stx = buf.find(_STX, pos)
+        if stx != pos:
+            end = len(buf) if stx < 0 else stx
+            self.pos = end
+            self.discarded += end - pos
+            if self.start_error:
+                return CommStartError("Start Error", bytes(buf[pos: end]))
+            if stx < 0:
+                return None
+            pos = stx
+
+        if len(buf) - pos < 3:
+            return None
+
+        dat_len  = buf[pos + 1] << 8
+        dat_len += buf[pos + 2]
+        if dat_len == 0 or dat_len > self.max_len:
+            self.pos = pos + 1
+            self.discarded += 1
+            return CommLengthError("Length Error", bytes(buf[pos: pos + 3]))
+
+        end = pos + 4 + dat_len
+        if len(buf) < end:
+            return None
+
+        raw = bytes(buf[pos: end])
+        if not Comm.check(raw):
+            self.pos = pos + 1
+            self.discarded += 1
+            return CommDataError("Data Error", raw)
+
+        self.pos = end
+        return raw
+
+    def skip(self):
+        raw = bytes(self.buf[self.pos: self.pos + 3])
+        self.pos += 1
+        self.discarded += 1
+        return CommLengthError("Length Error", raw)
+
+    def flush(self):
+        raw = bytes(self.buf[self.pos:])
+        self.buf.clear()
+        self.pos = 0
+        return raw
+
+
 class Comm(object):
     @staticmethod
     def calc_lrc(dat, lrc=0):
-        for c in dat:
-            lrc ^= c
-        return lrc
+        if len(dat) < 32:
+            for c in dat:
+                lrc ^= c
+            return lrc
+
+        # fold the frame as one wide integer down to 64 bits, then to 8 bits
+        val = int.from_bytes(dat, 'little')
+        bits = len(dat) * 8
+        while bits > 64:
+            half = (bits // 16) * 8
+            val = (val >> half) ^ (val & ((1 << half) - 1))
+            bits -= half
+        val ^= val >> 32
+        val ^= val >> 16
+        val ^= val >> 8
+        return (val ^ lrc) & 0xff
+
+    @staticmethod
+    def check(raw):
+        return (len(raw) >= 5 and raw[0] == _STX and raw[-2] == _ETX and
+                len(raw) == 4 + ((raw[1] << 8) | raw[2]) and Comm.calc_lrc(raw) == _STX)
+
+    @staticmethod
+    def check_frames(frames):
+        check = Comm.check
+        return [check(raw) for raw in frames]
 
     @staticmethod
     def build(dat):
@@ -60,60 +173,102 @@ class Comm(object):
             out.append(dev)
         return out
 
-    def __init__(self, port, speed=38400):
-        self.ser = serial.Serial()
-        self.ser.port = port
-        self.ser.baudrate = speed
-        self.ser.timeout = _TIMEOUT
-        self.ser.bytesize = serial.EIGHTBITS
-        self.ser.stopbits = serial.STOPBITS_TWO
-        self.ser.parity = serial.PARITY_NONE
-        self.ser.xonxoff = False
-        self.ser.rtscts = False
-        self.ser.dsrdtr = False
+    def __init__(self, port, speed=38400, transport=None, stopbits=serial.STOPBITS_TWO):
+        self.ser = None
+        # for pty:// this is the path the program on the other side has to open
+        self.peer_name = None
+        if transport is None and "://" in port:
+            from transport import open_transport
+            transport = open_transport(port, speed)
+            self.peer_name = getattr(transport, "name", None)
+
+        if transport is not None:
+            self.ser = transport
+        else:
+            self.ser = serial.Serial()
+            self.ser.port = port
+            self.ser.baudrate = speed
+            self.ser.timeout = _READ_POLL
+            self.ser.bytesize = serial.EIGHTBITS
+            self.ser.stopbits = stopbits
+            self.ser.parity = serial.PARITY_NONE
+            self.ser.xonxoff = False
+            self.ser.rtscts = False
+            self.ser.dsrdtr = False
+        self.decoder = FrameDecoder()
+        self.rx_start = None
+        self.metrics = None
 
     def __del__(self):
         self.close()
 
+    def char_time(self):
+        bits = 1 + self.ser.bytesize + self.ser.stopbits + (0 if self.ser.parity == serial.PARITY_NONE else 1)
+        return bits / self.ser.baudrate
+
     def open(self):
         if not self.ser.is_open:
             self.ser.open()
 
     def close(self):
-        if self.ser.is_open:
+        if self.ser and self.ser.is_open:
             self.ser.close()
 
     def write(self, raw):
         self.ser.write(raw)
-
-    def read(self, timeout=_TIMEOUT, start_error=False):
-        self.ser.timeout = timeout
-
+        if self.metrics:
+            self.metrics.count_out(raw)
+
+    def fill(self):
+        raw = self.ser.read(self.ser.in_waiting or 1)
+        if self.metrics:
+            self.metrics.count_read(len(raw))
+        if len(raw) > 0:
+            self.decoder.feed(raw)
+        return len(raw)
+
+    def read(self, timeout=_TIMEOUT, start_error=False, frame_deadline=None):
+        # frame_deadline (time.monotonic) also bounds the wait for the rest of a partial frame
+        if self.ser.timeout != _READ_POLL:
+            self.ser.timeout = _READ_POLL
+
+        self.decoder.start_error = start_error
+        deadline = time.monotonic() + timeout
         while True:
-            raw = self.ser.read(1)
-            if len(raw) != 1:
-                raise CommTimeoutError("Timeout Error", None)
-
-            if raw[0] == _STX:
-                self.ser.timeout = 3
-
-                raw += self.ser.read(3)
-                if len(raw) != 4:
-                    raise CommLengthError("Length Error", raw)
-
-                dat_len  = raw[1] << 8
-                dat_len += raw[2]
-                raw += self.ser.read(dat_len)
-                if len(raw) != 4 + dat_len:
-                    raise CommLengthError("Length Error", raw)
-
-                if self.calc_lrc(raw) != _STX:
-                    raise CommDataError("Data Error", raw)
-
-                return raw
-            else:
-                if start_error:
-                    raise CommStartError("Start Error", raw)
+            item = self.decoder.next()
+            if item is not None:
+                self.rx_start = None
+                if self.metrics:
+                    self.metrics.count_in(item)
+                    self.metrics.discarded = self.decoder.discarded
+                if isinstance(item, CommError):
+                    raise item
+                return item
+
+            now = time.monotonic()
+            if len(self.decoder) == 0:
+                if now >= deadline:
+                    ex = CommTimeoutError("Timeout Error", None)
+                    if self.metrics:
+                        self.metrics.count_in(ex)
+                    raise ex
+            elif frame_deadline is not None and now >= frame_deadline:
+                if self.rx_start is None:
+                    self.rx_start = now
+                ex = CommTimeoutError("Timeout Error", None)
+                if self.metrics:
+                    self.metrics.count_in(ex)
+                raise ex
+            elif self.rx_start is None:
+                self.rx_start = now
+            elif now - self.rx_start >= _FRAME_TIMEOUT:
+                self.rx_start = None
+                ex = CommLengthError("Length Error", self.decoder.flush())
+                if self.metrics:
+                    self.metrics.count_in(ex)
+                raise ex
+
+            self.fill()
 
     def send(self, dat):
         self.write(self.build(dat))
@@ -123,6 +278,12 @@ class Comm(object):
 
 
 if __name__ == '__main__':
+    decoder = FrameDecoder(True)
+    stream = b'\xff' + Comm.build(b'12345') + Comm.build(b'ABCDE')[:-1] + b'\x00' + Comm.build(b'abcde')
+    for pos in range(0, len(stream), 4):
+        for item in decoder.feed(stream[pos: pos + 4]):
+            print(repr(item), getattr(item, 'raw', None))
+
     comm = Comm('/dev/pts/2', 38400)
     print(comm)
     try:
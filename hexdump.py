@@ -1,30 +1,60 @@
-def hexdump(dat):
-    out = ""
-    for i in range(0, len(dat), 16):
-        h = ' '.join(["%02X" % c for c in dat[i:i + 16]])
-        a = ''.join(["%c" % c if 0x20 <= c <= 0x7e else '.' for c in dat[i:i + 16]])
-        out += f"  {i:08X}  {h:<47s}  |{a}|\n"
-    out += f"  {len(dat):08X}"
-    return out
+import codecs
+import functools
+
+_CACHE_SIZE = 64
+_ASCII = bytes(c if 0x20 <= c <= 0x7e else 0x2e for c in range(256))
+_CONTROL = dict.fromkeys(list(range(0x20)) + [0x7f], '.')
+
+
+def _strdump_error(ex):
+    return '.', ex.start + 1
+
+
+codecs.register_error("strdump", _strdump_error)
+
+
+def _spaced_hex(dat):
+    # bytes.hex(sep) is python 3.8+, the gui is still run on 3.6
+    try:
+        return dat.hex(' ')
+    except TypeError:
+        h = dat.hex()
+        return ' '.join(h[i: i + 2] for i in range(0, len(h), 2))
+
+
+def hexdump(dat, start=0, lines=None):
+    return _hexdump(bytes(dat), start, lines)
 
 
 def strdump(dat, encoding):
-    out = ""
-    pos = 0
-    while pos < len(dat):
-        if dat[pos] >= 0x80:
-            try:
-                out += dat[pos:pos + 2].decode(encoding=encoding)
-                pos += 2
-                continue
-            except Exception as ex:
-                print(f"make_strdump: {dat[pos:pos + 2]} {ex}")
-
-        out += chr(dat[pos]) if 0x20 <= dat[pos] <= 0x7e else '.'
-        pos += 1
+    return _strdump(bytes(dat), encoding)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _hexdump(dat, start, lines):
+    begin = min(start * 16, len(dat))
+    end = len(dat) if lines is None else min(len(dat), begin + lines * 16)
+    h = _spaced_hex(dat[begin: end]).upper()
+    a = dat[begin: end].translate(_ASCII).decode('ascii')
+
+    out = []
+    for i in range(0, end - begin, 16):
+        out.append(f"  {begin + i:08X}  {h[i * 3: i * 3 + 47]:<47s}  |{a[i: i + 16]}|")
+    if end == len(dat):
+        out.append(f"  {len(dat):08X}")
+    return '\n'.join(out)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _strdump(dat, encoding):
+    out = dat.decode(encoding, errors="strdump").translate(_CONTROL)
     return "|" + out + "|"
 
 
+def count_lines(dat):
+    return (len(dat) + 15) // 16 + 1
+
+
 if __name__ == '__main__':
     print(hexdump(b'1234567890ABCDEF'))
     print(strdump(b'1234567890ABCDEF', encoding='euc-kr'))
@@ -0,0 +1,133 @@
+import argparse
+import math
+import os
+import threading
+import time
+
+from comm import Comm, CommError, CommTimeoutError
+from replay import Replayer
+
+_PROFILES = ("steady", "burst", "ramp")
+
+
+class LoadGenerator(object):
+    def __init__(self, comm, payloads, rate=None, utilization=None, profile="steady", burst=10, ramp=10):
+        self.comm = comm
+        self.payloads = payloads
+        if utilization is not None:
+            size = sum(len(raw) for raw in payloads) / len(payloads)
+            rate = utilization / 100 / (size * comm.char_time())
+        self.rate = rate
+        self.profile = profile
+        self.burst = burst
+        self.ramp = ramp
+        self.acked = 0
+        self.errors = 0
+        self.running = False
+
+    def schedule(self, n):
+        if self.profile == "burst":
+            return (n // self.burst) * self.burst / self.rate
+        if self.profile == "ramp" and self.ramp > 0:
+            ramped = self.rate * self.ramp / 2
+            if n < ramped:
+                return math.sqrt(2 * self.ramp * n / self.rate)
+            return self.ramp + (n - ramped) / self.rate
+        return n / self.rate
+
+    def run_comm_thread(self):
+        while self.running:
+            try:
+                self.comm.read(0.1)
+                self.acked += 1
+            except CommTimeoutError:
+                pass
+            except CommError:
+                self.errors += 1
+
+    def run(self, duration, count=None, linger=1.0):
+        self.acked = 0
+        self.errors = 0
+        self.running = True
+        thread = threading.Thread(target=self.run_comm_thread, daemon=True)
+        thread.start()
+
+        sent = 0
+        sent_bytes = 0
+        backlog = 0
+        late = []
+        start = time.perf_counter()
+        end = None
+        try:
+            while count is None or sent < count:
+                target = self.schedule(sent)
+                if target >= duration:
+                    end = start + duration
+                    break
+                Replayer.wait_until(start + target)
+                late.append(time.perf_counter() - start - target)
+
+                raw = self.payloads[sent % len(self.payloads)]
+                self.comm.write(raw)
+                sent += 1
+                sent_bytes += len(raw)
+                backlog = max(backlog, sent - self.acked)
+            elapsed = max(time.perf_counter(), end or 0) - start
+
+            deadline = time.perf_counter() + linger
+            while self.acked + self.errors < sent and time.perf_counter() < deadline:
+                time.sleep(0.01)
+        finally:
+            self.running = False
+            thread.join()
+
+        late.sort()
+        return {
+            "target_rate": self.rate,
+            "achieved_rate": sent / elapsed if elapsed else 0,
+            "utilization": sent_bytes * self.comm.char_time() / elapsed * 100 if elapsed else 0,
+            "sent": sent,
+            "acked": self.acked,
+            "errors": self.errors,
+            "error_rate": self.errors / sent if sent else 0,
+            "backlog_max": backlog,
+            "backlog_end": sent - self.acked,
+            "late_p99": late[min(len(late) - 1, len(late) * 99 // 100)] if late else 0,
+            "late_max": late[-1] if late else 0,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="send framed load at a paced rate")
+    parser.add_argument("port")
+    parser.add_argument("--speed", type=int, default=38400)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rate", type=float, help="frames per second")
+    group.add_argument("--utilization", type=float, help="percent of the line rate")
+    parser.add_argument("--profile", choices=_PROFILES, default="steady")
+    parser.add_argument("--burst", type=int, default=10, help="frames per burst")
+    parser.add_argument("--ramp", type=float, default=10, help="seconds to reach the target rate")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--csv", default="main.csv", help="preset file")
+    parser.add_argument("--preset", action="append", help="preset to send, may be repeated")
+    parser.add_argument("--size", type=int, default=64, help="random payload size when no preset is given")
+    args = parser.parse_args()
+
+    if args.preset:
+        from preset import PresetStore
+        store = PresetStore(args.csv)
+        store.load()
+        payloads = [store.get(key).build() for key in args.preset]
+    else:
+        payloads = [Comm.build(os.urandom(args.size)) for _ in range(16)]
+
+    comm = Comm(args.port, args.speed)
+    try:
+        comm.open()
+        generator = LoadGenerator(comm, payloads, args.rate, args.utilization, args.profile, args.burst, args.ramp)
+        for key, val in generator.run(args.duration).items():
+            print(f"{key}: {val}")
+    except CommError as ex:
+        print(str(ex))
+    finally:
+        comm.close()
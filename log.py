@@ -0,0 +1,101 @@
+import collections
+import datetime
+
+_SIZE = 100000
+_QUEUE_SIZE = 10000
+_DUMP = 256
+
+LogRecord = collections.namedtuple("LogRecord", ["ts", "sender", "raw"])
+
+
+class LogBuffer(object):
+    def __init__(self, size=_SIZE):
+        self.size = size
+        self.items = [None] * size
+        self.start = 0
+        self.count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("log index out of range")
+        return self.items[(self.start + index) % self.size]
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.items[(self.start + index) % self.size]
+
+    def is_full(self):
+        return self.count == self.size
+
+    def append(self, ts, sender, raw):
+        record = LogRecord(ts, sender, bytes(raw or b''))
+        if self.count == self.size:
+            self.items[self.start] = record
+            self.start = (self.start + 1) % self.size
+        else:
+            self.items[(self.start + self.count) % self.size] = record
+            self.count += 1
+        self.total += 1
+        return record
+
+    def first_id(self):
+        return self.total - self.count
+
+    def popleft(self):
+        if self.count == 0:
+            raise IndexError("pop from an empty log")
+        record = self.items[self.start]
+        self.items[self.start] = None
+        self.start = (self.start + 1) % self.size
+        self.count -= 1
+        return record
+
+    def clear(self):
+        self.items = [None] * self.size
+        self.start = 0
+        self.count = 0
+
+    @staticmethod
+    def format(record):
+        ts = datetime.datetime.fromtimestamp(record.ts).strftime("%H:%M:%S.%f")[:-3]
+        dump = record.raw[:_DUMP].hex().upper()
+        if len(record.raw) > _DUMP:
+            dump += "..."
+        return f"[{ts}] {record.sender} {dump}"
+
+
+class LogQueue(object):
+    # deque.append/popleft are atomic, so the reader thread never waits on the GUI
+    def __init__(self, size=_QUEUE_SIZE):
+        self.size = size
+        self.records = collections.deque()
+        self.dropped = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def put(self, ts, sender, raw):
+        depth = len(self.records)
+        if depth >= self.size:
+            self.dropped += 1
+            return False
+        if depth >= self.peak:
+            self.peak = depth + 1
+        self.records.append(LogRecord(ts, sender, bytes(raw or b'')))
+        return True
+
+    def get_all(self, limit=None):
+        out = []
+        count = len(self.records)
+        if limit is not None and limit < count:
+            count = limit
+        for _ in range(count):
+            out.append(self.records.popleft())
+        return out
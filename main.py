@@ -7,42 +7,125 @@
 # $ ./make_exe.sh
 # $ ./dist/CommTest
 
-import binascii
-import csv
 import datetime
 import os
 import sys
 import threading
-from PyQt5 import uic
-from PyQt5.QtCore import pyqtSlot
+import time
+from startup import StartupTimer  # before the Qt imports so the startup report includes them
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, Qt, QAbstractListModel, QModelIndex, QTimer
 from PyQt5.QtWidgets import QMainWindow, QApplication, QMessageBox
 
 from comm import Comm, CommError, CommTimeoutError
-from packet import PacketBuilder
+from log import LogBuffer, LogQueue
+from metrics import Metrics
+from preset import PresetStore
+from search import LogIndex
+from writer import Writer
 import hexdump
 
 _ENCODING = "euc-kr"
+_LOG_SIZE = 100000
+_LOG_INTERVAL = 50
+_UI_FILE = "gui/window.ui"
+
+
+def load_ui(window):
+    # the generated gui/window.py skips parsing the .ui at runtime, unless it is older than the .ui
+    try:
+        from gui import window as generated
+    except ImportError:
+        generated = None
+
+    stale = generated is None
+    if generated and not getattr(sys, "frozen", False) and os.path.exists(_UI_FILE):
+        try:
+            stale = os.path.getmtime(_UI_FILE) > os.path.getmtime(generated.__file__)
+        except (AttributeError, TypeError, OSError):
+            stale = False
+
+    if generated and not stale:
+        ui = generated.Ui_MainWindow()
+        ui.setupUi(window)
+        return ui
+
+    from PyQt5 import uic
+    return uic.loadUi(_UI_FILE, window)
+
+
+class LogModel(QAbstractListModel):
+    def __init__(self, log, parent=None):
+        super().__init__(parent)
+        self.log = log
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.log)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return LogBuffer.format(self.log[index.row()])
+        return None
+
+    def extend(self, records):
+        records = records[-self.log.size:]
+        count = len(self.log) + len(records) - self.log.size
+        if count > 0:
+            self.beginRemoveRows(QModelIndex(), 0, count - 1)
+            for _ in range(count):
+                self.log.popleft()
+            self.endRemoveRows()
+
+        row = len(self.log)
+        self.beginInsertRows(QModelIndex(), row, row + len(records) - 1)
+        for record in records:
+            self.log.append(*record)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.log.clear()
+        self.endResetModel()
 
 
 class App(QMainWindow):
-    def __init__(self):
+    scanned = pyqtSignal(list, bool, float, float)
+
+    def __init__(self, startup=None):
         super().__init__()
-        if os.path.exists("gui/window.ui"):
-            self.ui = uic.loadUi("gui/window.ui", self)
-        else:
-            from gui.window import Ui_MainWindow
-            self.ui = Ui_MainWindow()
-            self.ui.setupUi(self)
+        self.startup = startup
+        self.ui = load_ui(self)
+        if self.startup:
+            self.startup.mark("ui")
         self.comm = None
+        self.writer = None
+        self.metrics = Metrics()
         self.comm_thread_running = False
         self.comm_thread = None
-        self.preset = {}
-        self.has_log = 0
-        self.on_btn_reload_clicked()
+        self.preset = PresetStore(os.path.splitext(sys.argv[0])[0] + '.csv', _ENCODING)
+        self.log = LogBuffer(_LOG_SIZE)
+        self.log_queue = LogQueue()
+        self.log_model = LogModel(self.log, self)
+        self.log_index = LogIndex(self.log, _ENCODING)
+        self.search_status = ""
+        self.port_status = ""
+        self.ui.lst_log.setModel(self.log_model)
+        self.ui.lst_log.selectionModel().currentChanged.connect(self.on_log_current_changed)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.on_log_timer)
+        self.log_timer.start(_LOG_INTERVAL)
+        self.scanning = False
+        self.scanned.connect(self.on_scanned)
+        self.init_speed()
+        if self.startup:
+            self.startup.mark("init")
+        QTimer.singleShot(0, self.on_started)
 
-    def init_port(self):
-        items = Comm.scan_ports()
+    def on_started(self):
+        if self.startup:
+            self.startup.mark("shown")
+        self.on_btn_reload_clicked()
 
+    def init_port(self, items):
         item = self.ui.cb_port.currentText()
         if len(item) == 0 and len(items) > 0:
             item = items[0]
@@ -63,31 +146,58 @@ class App(QMainWindow):
         self.ui.cb_speed.setCurrentText(item)
 
     def init_preset(self):
-        self.preset = {}
-        try:
-            filename = os.path.splitext(sys.argv[0])[0] + '.csv'
-            with open(filename, 'r', encoding=_ENCODING) as f:
-                reader = csv.reader(f, skipinitialspace=True)
-                for key, *val in reader:
-                    self.preset[key] = val
-        except Exception as ex:
-            print(f"init_preset: {ex}")
-
         self.ui.lst_preset.clear()
-        self.ui.lst_preset.addItems(list(self.preset.keys()))
+        self.ui.lst_preset.addItems(self.preset.keys())
 
     @pyqtSlot()
     def on_btn_reload_clicked(self):
         if self.comm:
             self.on_btn_open_clicked()
+        if self.scanning:
+            return
 
-        self.init_port()
+        # port enumeration can take seconds with many usb adapters, keep it off the gui thread
+        self.scanning = True
+        self.ui.btn_reload.setEnabled(False)
         self.init_speed()
-        self.init_preset()
+        threading.Thread(target=self.run_scan_thread, daemon=True).start()
+
+    def run_scan_thread(self):
+        start = time.perf_counter()
+        try:
+            ports = Comm.scan_ports()
+        except Exception as ex:
+            print(f"run_scan_thread: {ex}")
+            ports = []
+        port_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            loaded = self.preset.load()
+        except Exception as ex:
+            print(f"init_preset: {ex}")
+            loaded = True
+        preset_time = time.perf_counter() - start
+
+        self.scanned.emit(ports, loaded, port_time, preset_time)
+
+    def on_scanned(self, ports, loaded, port_time, preset_time):
+        self.init_port(ports)
+        if loaded:
+            self.init_preset()
+        self.scanning = False
+        self.ui.btn_reload.setEnabled(True)
+
+        if self.startup:
+            self.startup.measure("ports", port_time)
+            self.startup.measure("preset", preset_time)
+            self.startup.report()
+            self.startup = None
 
     @pyqtSlot()
     def on_btn_clear_clicked(self):
-        self.ui.lst_log.clear()
+        self.log_model.clear()
+        self.log_index.clear()
         self.ui.edt_log.clear()
         self.ui.txt_log.clear()
 
@@ -103,33 +213,61 @@ class App(QMainWindow):
     def on_btn_send_clicked(self):
         try:
             if self.comm:
-                dat = self.ui.edt_dat.toPlainText().replace('\n', '').encode(_ENCODING)
-                dat = PacketBuilder().decode(dat).build()
-                dat = Comm.build(dat)
+                dat = self.ui.edt_dat.toPlainText().replace('\n', '')
+                dat = self.preset.compile(dat).build()
 
-                self.append_log(dat, ">>")
-                self.scroll_log()
-
-                self.comm.write(dat)
+                self.writer.put(dat)
         except Exception as ex:
             QMessageBox.warning(self, "SEND", str(ex))
 
     def append_log(self, dat, sender):
-        ts = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        dump = binascii.hexlify(dat).decode().upper()
-        self.ui.lst_log.addItem(f"[{ts}] {sender} {dump}")
-        self.has_log = 1
+        self.log_queue.put(time.time(), sender, dat)
+
+    def on_write_sent(self, request):
+        self.append_log(request.raw, ">>")
 
-    def scroll_log(self):
-        if self.has_log:
+    def on_log_timer(self):
+        records = self.log_queue.get_all()
+        if records:
+            self.log_model.extend(records)
             self.ui.lst_log.scrollToBottom()
-            self.has_log = 0
+        self.ui.statusbar.showMessage(
+            f"{self.port_status}{self.search_status}{self.metrics.format()}, "
+            f"queue {len(self.log_queue)}/{self.log_queue.peak}, dropped {self.log_queue.dropped}")
+
+    @pyqtSlot()
+    def on_btn_search_clicked(self):
+        query = self.ui.edt_search.text()
+        if not query:
+            self.search_status = ""
+            return
+
+        try:
+            hits = self.log_index.search(query)
+        except Exception as ex:
+            QMessageBox.warning(self, "FIND", str(ex))
+            return
+
+        if not hits:
+            self.search_status = "not found, "
+            return
+
+        row = self.ui.lst_log.currentIndex().row()
+        hit = next((i for i in hits if i > row), hits[0])
+        self.search_status = f"found {hits.index(hit) + 1}/{len(hits)}, "
+        index = self.log_model.index(hit)
+        self.ui.lst_log.setCurrentIndex(index)
+        self.ui.lst_log.scrollTo(index)
 
     @pyqtSlot()
-    def on_lst_log_itemSelectionChanged(self):
-        log = self.ui.lst_log.currentItem().text()
-        ts, sender, dump = log.split()
-        dat = binascii.unhexlify(dump)
+    def on_edt_search_returnPressed(self):
+        self.on_btn_search_clicked()
+
+    def on_log_current_changed(self, current, previous):
+        if not current.isValid():
+            return
+        ts, sender, dat = self.log[current.row()]
+        ts = datetime.datetime.fromtimestamp(ts).strftime("[%H:%M:%S.%f")[:-3] + "]"
         hd = hexdump.hexdump(dat)
         sd = hexdump.strdump(dat, encoding=_ENCODING)
         self.ui.edt_log.setPlainText(f"{ts} {sender} {len(dat)} bytes\n{hd}")
@@ -142,14 +280,23 @@ class App(QMainWindow):
             self.comm_thread.join()
             self.comm_thread = None
 
+            self.writer.stop()
+            self.writer = None
+
             self.comm.close()
             self.comm = None
+            self.port_status = ""
 
             self.ui.btn_open.setText("&OPEN")
         else:
             try:
                 self.comm = Comm(self.ui.cb_port.currentText(), int(self.ui.cb_speed.currentText()))
                 self.comm.open()
+                self.metrics = Metrics()
+                self.comm.metrics = self.metrics
+                self.port_status = f"peer {self.comm.peer_name}, " if self.comm.peer_name else ""
+                self.writer = Writer(self.comm, on_sent=self.on_write_sent)
+                self.writer.start()
 
                 self.comm_thread_running = True
                 self.comm_thread = threading.Thread(target=self.run_comm_thread, daemon=True)
@@ -168,7 +315,7 @@ class App(QMainWindow):
                 dat = self.comm.read(1, True)
                 self.append_log(dat, "<<")
             except CommTimeoutError as ex:
-                self.scroll_log()
+                pass
             except CommError as ex:
                 self.append_log(ex.raw, "<" + str(ex)[0])
             except Exception as ex:
@@ -179,8 +326,11 @@ class App(QMainWindow):
 
 
 if __name__ == '__main__':
+    startup = StartupTimer()
+    startup.mark("imports")
     app = QApplication(sys.argv)
-    window = App()
+    startup.mark("app")
+    window = App(startup)
     window.setWindowTitle(os.path.splitext(os.path.basename(sys.argv[0]))[0])
     window.show()
     sys.exit(app.exec())
@@ -8,10 +8,11 @@
 # $ ./make_exe.sh
 # $ ./dist/CommTest
 
-import csv
 import os
 import sys
 import threading
+import time
+from startup import StartupTimer  # before tkinter so the startup report includes it
 import tkinter as tk
 import tkinter.ttk as ttk
 import datetime
@@ -19,28 +20,55 @@ from tkinter import messagebox
 
 import hexdump
 from comm import *
-from packet import PacketBuilder
+from log import LogBuffer, LogQueue
+from metrics import Metrics
+from preset import PresetStore
+from search import LogIndex
+from writer import Writer
 
 _ENCODING = 'euc-kr'
+_LOG_SIZE = 10000
+_LOG_INTERVAL = 50
+_SCAN_INTERVAL = 50
 
 
 class App(tk.Frame):
-    def __init__(self, master=None):
+    def __init__(self, master=None, startup=None):
         super().__init__(master)
         self.master = master
+        self.startup = startup
         self.pack(fill=tk.BOTH, expand=True)
         self.create_widgets_1st()
         self.create_widgets_2nd()
         self.create_widgets_3rd()
+        if self.startup:
+            self.startup.mark("ui")
         self.master.bind_class("Text", "<Control-a>", self.on_select_all_text)
         self.master.bind_class("Entry", "<Control-a>", self.on_select_all_entry)
 
         self.comm = None
+        self.writer = None
+        self.metrics = Metrics()
         self.comm_thread_running = False
         self.comm_thread = None
-        self.preset = {}
-        self.has_log = 0
+        self.preset = PresetStore(os.path.splitext(sys.argv[0])[0] + '.csv', _ENCODING)
+        self.log = LogBuffer(_LOG_SIZE)
+        self.log_queue = LogQueue()
+        self.log_index = LogIndex(self.log, _ENCODING)
+        self.search_status = ""
+        self.port_status = ""
+        self.scan_thread = None
+        self.scan_result = None
 
+        self.init_speed()
+        self.after(_LOG_INTERVAL, self.on_log_timer)
+        if self.startup:
+            self.startup.mark("init")
+        self.after_idle(self.on_started)
+
+    def on_started(self):
+        if self.startup:
+            self.startup.mark("shown")
         self.on_reload_btn_clicked()
 
     def create_widgets_1st(self):
@@ -71,6 +99,14 @@ class App(tk.Frame):
         self.master.bind('<Alt-r>', self.on_reload_btn_clicked)
         self.reload_btn.pack(side=tk.RIGHT)
 
+        self.search_btn = tk.Button(frame, text="FIND", underline=1, command=self.on_search_btn_clicked)
+        self.master.bind('<Alt-i>', self.on_search_btn_clicked)
+        self.search_btn.pack(side=tk.RIGHT)
+
+        self.search_ed = tk.Entry(frame)
+        self.search_ed.bind('<Return>', self.on_search_btn_clicked)
+        self.search_ed.pack(side=tk.RIGHT)
+
     def create_widgets_2nd(self):
         frame = tk.Frame(self)
         frame.pack(fill=tk.BOTH, expand=True)
@@ -145,6 +181,9 @@ class App(tk.Frame):
         self.log_ed = tk.Entry(frame)
         self.log_ed.pack(fill=tk.X)
 
+        self.status_label = tk.Label(self, anchor=tk.W)
+        self.status_label.pack(fill=tk.X)
+
     def on_select_all_text(self, event=None):
         event.widget.tag_add(tk.SEL, '1.0', tk.END)
 
@@ -154,14 +193,55 @@ class App(tk.Frame):
     def on_reload_btn_clicked(self, event=None):
         if self.comm:
             self.on_open_btn_clicked()
+        if self.scan_thread:
+            return
 
-        self.init_port()
+        # port enumeration can take seconds with many usb adapters, keep it off the gui thread
+        self.reload_btn.config(state=tk.DISABLED)
         self.init_speed()
-        self.init_preset()
+        self.scan_result = None
+        self.scan_thread = threading.Thread(target=self.run_scan_thread, daemon=True)
+        self.scan_thread.start()
+        self.after(_SCAN_INTERVAL, self.on_scan_timer)
 
-    def init_port(self):
-        items = Comm.scan_ports()
+    def run_scan_thread(self):
+        start = time.perf_counter()
+        try:
+            ports = Comm.scan_ports()
+        except Exception as ex:
+            print(f"run_scan_thread: {ex}")
+            ports = []
+        port_time = time.perf_counter() - start
 
+        start = time.perf_counter()
+        try:
+            loaded = self.preset.load()
+        except Exception as ex:
+            print(f"load_preset: {ex}")
+            loaded = True
+        preset_time = time.perf_counter() - start
+
+        self.scan_result = (ports, loaded, port_time, preset_time)
+
+    def on_scan_timer(self):
+        if self.scan_result is None:
+            self.after(_SCAN_INTERVAL, self.on_scan_timer)
+            return
+
+        ports, loaded, port_time, preset_time = self.scan_result
+        self.scan_thread = None
+        self.init_port(ports)
+        if loaded:
+            self.init_preset()
+        self.reload_btn.config(state=tk.NORMAL)
+
+        if self.startup:
+            self.startup.measure("ports", port_time)
+            self.startup.measure("preset", preset_time)
+            self.startup.report()
+            self.startup = None
+
+    def init_port(self, items):
         item = self.port_cb.get()
         if len(item) == 0 and len(items) > 0:
             item = items[0]
@@ -180,21 +260,13 @@ class App(tk.Frame):
         self.speed_cb.set(item)
 
     def init_preset(self):
-        self.preset = {}
-        try:
-            filename = os.path.splitext(sys.argv[0])[0] + '.csv'
-            with open(filename, 'r', encoding=_ENCODING) as f:
-                reader = csv.reader(f, skipinitialspace=True)
-                for key, *val in reader:
-                    self.preset[key] = val
-        except Exception as ex:
-            print(f'load_preset: {ex}')
-
         self.preset_lb.delete(0, tk.END)
-        for key in self.preset:
+        for key in self.preset.keys():
             self.preset_lb.insert(tk.END, key)
 
     def on_clear_btn_clicked(self, event=None):
+        self.log.clear()
+        self.log_index.clear()
         self.log_lb.delete(0, tk.END)
         self.log_txt.delete("1.0", tk.END)
         self.log_ed.delete(0, tk.END)
@@ -214,27 +286,37 @@ class App(tk.Frame):
         try:
             if self.comm:
                 dat = self.data_txt.get("1.0", tk.END)
-                dat = dat.replace("\n", "").encode(_ENCODING)
-                dat = PacketBuilder().decode(dat).build()
-                dat = Comm.build(dat)
-
-                self.append_log(dat, ">>")
-                self.scroll_log()
+                dat = dat.replace("\n", "")
+                dat = self.preset.compile(dat).build()
 
-                self.comm.write(dat)
+                self.writer.put(dat)
         except Exception as ex:
             messagebox.showerror("SEND", str(ex))
 
     def append_log(self, dat, sender):
-        ts = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        dump = binascii.hexlify(dat).decode().upper()
-        self.log_lb.insert(tk.END, f'[{ts}] {sender} {dump}')
-        self.has_log = 1
-
-    def scroll_log(self):
-        if self.has_log:
+        self.log_queue.put(time.time(), sender, dat)
+
+    def on_write_sent(self, request):
+        self.append_log(request.raw, ">>")
+
+    def on_log_timer(self):
+        records = self.log_queue.get_all()[-self.log.size:]
+        if records:
+            count = len(self.log) + len(records) - self.log.size
+            if count > 0:
+                for _ in range(count):
+                    self.log.popleft()
+                self.log_lb.delete(0, count - 1)
+
+            for record in records:
+                self.log.append(*record)
+            self.log_lb.insert(tk.END, *[LogBuffer.format(record) for record in records])
             self.log_lb.yview(tk.END)
-            self.has_log = 0
+
+        self.status_label.config(
+            text=f"{self.port_status}{self.search_status}{self.metrics.format()}, "
+            f"queue {len(self.log_queue)}/{self.log_queue.peak}, dropped {self.log_queue.dropped}")
+        self.after(_LOG_INTERVAL, self.on_log_timer)
 
     def on_open_btn_clicked(self, event=None):
         if self.comm:
@@ -242,8 +324,12 @@ class App(tk.Frame):
             self.comm_thread.join()
             self.comm_thread = None
 
+            self.writer.stop()
+            self.writer = None
+
             self.comm.close()
             self.comm = None
+            self.port_status = ""
 
             self.open_btn.config(text="OPEN", underline=0)
         else:
@@ -251,6 +337,11 @@ class App(tk.Frame):
                 print(self.port_cb.get(), self.speed_cb.get())
                 self.comm = Comm(self.port_cb.get(), int(self.speed_cb.get()))
                 self.comm.open()
+                self.metrics = Metrics()
+                self.comm.metrics = self.metrics
+                self.port_status = f"peer {self.comm.peer_name}, " if self.comm.peer_name else ""
+                self.writer = Writer(self.comm, on_sent=self.on_write_sent)
+                self.writer.start()
 
                 self.comm_thread_running = True
                 self.comm_thread = threading.Thread(target=self.run_comm_thread, daemon=True)
@@ -269,7 +360,7 @@ class App(tk.Frame):
                 dat = self.comm.read(1, True)
                 self.append_log(dat, "<<")
             except CommTimeoutError as ex:
-                self.scroll_log()
+                pass
             except CommError as ex:
                 self.append_log(ex.raw, "<" + str(ex)[0])
             except Exception as ex:
@@ -278,12 +369,36 @@ class App(tk.Frame):
 
         print("run_comm_thread: stop")
 
-    def on_log_lb_selected(self, event):
+    def on_search_btn_clicked(self, event=None):
+        query = self.search_ed.get()
+        if not query:
+            self.search_status = ""
+            return
+
+        try:
+            hits = self.log_index.search(query)
+        except Exception as ex:
+            messagebox.showerror("FIND", str(ex))
+            return
+
+        if not hits:
+            self.search_status = "not found, "
+            return
+
+        selection = self.log_lb.curselection()
+        row = selection[0] if selection else -1
+        hit = next((i for i in hits if i > row), hits[0])
+        self.search_status = f"found {hits.index(hit) + 1}/{len(hits)}, "
+        self.log_lb.selection_clear(0, tk.END)
+        self.log_lb.selection_set(hit)
+        self.log_lb.see(hit)
+        self.on_log_lb_selected()
+
+    def on_log_lb_selected(self, event=None):
         index = self.log_lb.curselection()[0]
-        log = self.log_lb.get(index)
-        ts, sender, dump = log.split()
+        ts, sender, dat = self.log[index]
+        ts = datetime.datetime.fromtimestamp(ts).strftime("[%H:%M:%S.%f")[:-3] + "]"
 
-        dat = binascii.unhexlify(dump)
         hd = hexdump.hexdump(dat)
         sd = hexdump.strdump(dat, encoding=_ENCODING)
 
@@ -295,7 +410,10 @@ class App(tk.Frame):
 
 
 if __name__ == '__main__':
+    startup = StartupTimer()
+    startup.mark("imports")
     root = tk.Tk()
     root.title(os.path.splitext(os.path.basename(sys.argv[0]))[0])
-    app = App(root)
+    startup.mark("app")
+    app = App(root, startup)
     app.mainloop()
@@ -1,2 +1,2 @@
-pyinstaller -F -w -n CommTest main.py gui/window.py comm.py packet.py hexdump.py
+pyinstaller -F -w -n CommTest main.py gui/window.py comm.py log.py packet.py preset.py search.py metrics.py writer.py startup.py hexdump.py
 cp main.csv ./dist/CommTest.csv
@@ -0,0 +1,120 @@
+import time
+
+from comm import CommError
+
+_BUCKETS = 40
+
+
+class Histogram(object):
+    # power of two buckets over microseconds
+    def __init__(self):
+        self.buckets = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[min(_BUCKETS - 1, int(value * 1e6).bit_length())] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for bucket, count in enumerate(other.buckets):
+            self.buckets[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def percentile(self, pct):
+        if self.count == 0:
+            return 0
+        rank = self.count * pct / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (1 << bucket) / 1e6)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.min or 0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max or 0,
+        }
+
+
+class Metrics(object):
+    def __init__(self):
+        self.started = time.monotonic()
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.reads = 0
+        self.discarded = 0
+        self.errors = {}
+        self.gap = Histogram()
+        self.rtt = Histogram()
+        self.tx = Histogram()
+        self.last_in = None
+
+    def count_read(self, size):
+        self.reads += 1
+
+    def count_in(self, item):
+        if isinstance(item, CommError):
+            name = type(item).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return
+
+        now = time.monotonic()
+        if self.last_in is not None:
+            self.gap.add(now - self.last_in)
+        self.last_in = now
+        self.frames_in += 1
+        self.bytes_in += len(item)
+
+    def count_out(self, raw):
+        self.frames_out += 1
+        self.bytes_out += len(raw)
+
+    def add_rtt(self, value):
+        self.rtt.add(value)
+
+    def add_tx(self, value):
+        self.tx.add(value)
+
+    def snapshot(self):
+        return {
+            "elapsed": time.monotonic() - self.started,
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "frames_out": self.frames_out,
+            "bytes_out": self.bytes_out,
+            "reads": self.reads,
+            "discarded": self.discarded,
+            "errors": dict(self.errors),
+            "gap": self.gap.summary(),
+            "rtt": self.rtt.summary(),
+            "tx": self.tx.summary(),
+        }
+
+    def format(self):
+        errors = " ".join(f"{name[4]}:{count}" for name, count in sorted(self.errors.items()))
+        return (f"in {self.frames_in}/{self.bytes_in}B, out {self.frames_out}/{self.bytes_out}B, "
+                f"reads {self.reads}, resync {self.discarded}B, errors [{errors}], "
+                f"gap p50 {self.gap.percentile(50) * 1000:.1f}ms, rtt p99 {self.rtt.percentile(99) * 1000:.1f}ms, "
+                f"tx p99 {self.tx.percentile(99) * 1000:.1f}ms")
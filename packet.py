@@ -1,9 +1,10 @@
 import binascii
+import re
 
 
 class PacketBuilder(object):
     def __init__(self, dat=b''):
-        self.dat = dat
+        self.dat = bytearray(dat)
 
     def __str__(self):
         return binascii.hexlify(self.dat).decode()
@@ -11,12 +12,15 @@ class PacketBuilder(object):
     def __repr__(self):
         return binascii.hexlify(self.dat).decode()
 
+    def __len__(self):
+        return len(self.dat)
+
     def build(self):
-        return self.dat
+        return bytes(self.dat)
 
     def append(self, value, key=None):
         if isinstance(value, int):
-            self.append(bytes([value]), key)
+            self.dat.append(value)
         else:
             self.dat += value
         return self
@@ -24,19 +28,23 @@ class PacketBuilder(object):
     def decode(self, value, key=None):
         pos = 0
         while pos < len(value):
+            esc = value.find(b'$', pos)
+            if esc < 0:
+                self.dat += value[pos:]
+                break
+
+            self.dat += value[pos: esc]
+            if value[esc + 1: esc + 2] == b'$':
+                self.dat.append(0x24)
+                pos = esc + 2
+                continue
+
             try:
-                if value[pos: pos + 2] == b'$$':
-                    self.append(value[pos: pos + 1])
-                    pos += 2
-                elif value[pos: pos + 1] == b'$':
-                    self.append(int(value[pos + 1: pos + 3], base=16))
-                    pos += 3
-                else:
-                    self.append(value[pos: pos + 1])
-                    pos += 1
-            except Exception as ex:
-                self.append(value[pos: pos + 1])
-                pos += 1
+                self.dat.append(int(value[esc + 1: esc + 3], base=16))
+                pos = esc + 3
+            except ValueError:
+                self.dat.append(0x24)
+                pos = esc + 1
         return self
 
 
@@ -45,6 +53,7 @@ class PacketParser(object):
         self.dat = dat
         self.pos = 0
         self.fs = fs
+        self.fields = {}
 
     def __str__(self):
         return binascii.hexlify(self.dat).decode()
@@ -53,32 +62,92 @@ class PacketParser(object):
         return binascii.hexlify(self.dat).decode()
 
     def parse(self, width, key=None, fs=True):
-        if width > len(self.dat) - self.pos:
-            width = len(self.dat) - self.pos
-
         pos = self.pos
-        for i in range(width):
-            if fs:
-                if self.dat[self.pos] in self.fs:
-                    break
-            self.pos += 1
-
-        return self.dat[pos: self.pos]
+        end = min(pos + width, len(self.dat))
+        if fs:
+            for c in self.fs:
+                found = self.dat.find(c, pos, end)
+                if found >= 0:
+                    end = found
+
+        self.pos = end
+        dat = self.dat[pos: end]
+        if key is not None:
+            self.fields[key] = dat
+        return dat
 
     def next(self, value, key=None):
+        end = self.dat.find(value, self.pos)
+        end = len(self.dat) if end < 0 else end + 1
         if value in self.fs:
-            fs = self.fs[0: self.fs.index(value)]
-        else:
-            fs = []
-
-        while self.pos < len(self.dat):
-            if self.dat[self.pos] == value:
-                self.pos += 1
-                return
-
-            if self.dat[self.pos] in fs:
-                break
-            self.pos += 1
+            for c in self.fs[0: self.fs.index(value)]:
+                found = self.dat.find(c, self.pos, end)
+                if found >= 0:
+                    end = found
+        self.pos = end
+
+
+class PacketSchema(object):
+    # fields are (key, width), (key, width, False) to ignore separators, or a separator to skip to
+    def __init__(self, fields, fs=[]):
+        self.fs = list(fs)
+        self.fs_re = re.compile(b'[' + re.escape(bytes(self.fs)) + b']') if self.fs else None
+        self.ops = []
+        for field in fields:
+            if isinstance(field, int):
+                higher = self.fs[0: self.fs.index(field)] if field in self.fs else []
+                self.ops.append((None, field, higher))
+            else:
+                key, width, *stop = field
+                self.ops.append((key, width, stop[0] if stop else True))
+
+    def keys(self):
+        return [key for key, width, stop in self.ops if key is not None]
+
+    def index(self, dat):
+        if self.fs_re is None:
+            return []
+        return [m.start() for m in self.fs_re.finditer(dat)]
+
+    def parse(self, dat):
+        seps = self.index(dat)
+        view = memoryview(dat)
+        size = len(dat)
+        out = {}
+        pos = 0
+        i = 0
+
+        for key, width, stop in self.ops:
+            while i < len(seps) and seps[i] < pos:
+                i += 1
+
+            if key is None:
+                if width not in self.fs:
+                    end = dat.find(width, pos)
+                    pos = size if end < 0 else end + 1
+                    continue
+                end = size
+                for sep in seps[i:]:
+                    if dat[sep] == width:
+                        end = sep + 1
+                        break
+                    if dat[sep] in stop:
+                        end = sep
+                        break
+                pos = end
+                continue
+
+            end = min(pos + width, size)
+            if stop and i < len(seps) and seps[i] < end:
+                end = seps[i]
+            out[key] = view[pos: end]
+            pos = end
+
+        return out
+
+    def parse_all(self, frames):
+        parse = self.parse
+        return [parse(dat) for dat in frames]
 
 
 if __name__ == '__main__':
@@ -95,3 +164,7 @@ if __name__ == '__main__':
     parser.next(0x1d)
     print(parser.parse(9, "ITEM2", False) == b'ABCDEFGH\x1c')
     print(parser.parse(10, "ITEM3") == b'abcdefgh')
+
+    schema = PacketSchema([("ITEM1", 5), 0x1d, ("ITEM2", 9, False), ("ITEM3", 10)], [0x1d, 0x1c])
+    fields = schema.parse(b'12345678\x1c\x1dABCDEFGH\x1cabcdefgh')
+    print(fields["ITEM1"] == b'12345' and fields["ITEM2"] == b'ABCDEFGH\x1c' and fields["ITEM3"] == b'abcdefgh')
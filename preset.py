@@ -0,0 +1,128 @@
+import csv
+import os
+import re
+import time
+
+from comm import Comm
+from packet import PacketBuilder
+
+_ENCODING = "euc-kr"
+_CACHE_SIZE = 256
+
+# ${name:width} marks a fixed width slot patched at send time, $$ stays a literal '$'
+_SLOT = re.compile(rb'\$\$|\$\{(\w+):(\d+)\}')
+
+
+class Preset(object):
+    def __init__(self, dat, encoding=_ENCODING):
+        if isinstance(dat, str):
+            dat = dat.encode(encoding)
+
+        builder = PacketBuilder()
+        slots = []
+        pos = 0
+        for m in _SLOT.finditer(dat):
+            if m.group(1) is None:
+                continue
+            builder.decode(dat[pos: m.start()])
+            name, width = m.group(1).decode(), int(m.group(2))
+            slots.append((name, len(builder), width))
+            builder.append(self.initial(name, width))
+            pos = m.end()
+        builder.decode(dat[pos:])
+
+        self.dat = builder.build()
+        self.raw = bytearray(Comm.build(self.dat))
+        self.slots = [(name, offset + 3, width) for name, offset, width in slots]
+        self.counter = 0
+
+    @staticmethod
+    def initial(name, width):
+        return (b'0' if name in ("counter", "time") else b' ') * width
+
+    def value(self, name, width, fields):
+        if name == "counter":
+            self.counter += 1
+            val = str(self.counter).zfill(width)[-width:]
+        elif name == "time":
+            val = time.strftime("%Y%m%d%H%M%S")[:width]
+        elif name in fields:
+            val = fields[name]
+        else:
+            return None
+
+        if isinstance(val, int):
+            val = str(val).zfill(width)
+        if isinstance(val, str):
+            val = val.encode(_ENCODING)
+        return val[:width].ljust(width, b' ')
+
+    def build(self, **fields):
+        raw = self.raw
+        for name, offset, width in self.slots:
+            # raw is shared between builds, so a slot without a value goes back to its initial bytes
+            val = self.value(name, width, fields)
+            if val is None:
+                val = self.initial(name, width)
+            if raw[offset: offset + width] == val:
+                continue
+            raw[-1] ^= Comm.calc_lrc(raw[offset: offset + width], Comm.calc_lrc(val))
+            raw[offset: offset + width] = val
+        return bytes(raw)
+
+
+class PresetStore(object):
+    def __init__(self, filename, encoding=_ENCODING):
+        self.filename = filename
+        self.encoding = encoding
+        self.mtime = None
+        self.preset = {}
+        self.compiled = {}
+
+    def load(self):
+        try:
+            mtime = os.stat(self.filename).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.mtime and mtime is not None:
+            return False
+
+        preset = {}
+        with open(self.filename, 'r', encoding=self.encoding) as f:
+            reader = csv.reader(f, skipinitialspace=True)
+            for key, *val in reader:
+                preset[key] = val
+
+        self.mtime = mtime
+        self.preset = preset
+        self.compiled = {}
+        return True
+
+    def keys(self):
+        return list(self.preset.keys())
+
+    def __getitem__(self, key):
+        return self.preset[key]
+
+    def compile(self, text):
+        preset = self.compiled.get(text)
+        if preset is None:
+            if len(self.compiled) >= _CACHE_SIZE:
+                self.compiled.clear()
+            preset = self.compiled[text] = Preset(text, self.encoding)
+        return preset
+
+    def get(self, key):
+        return self.compile(''.join(self.preset[key]))
+
+
+if __name__ == '__main__':
+    store = PresetStore("main.csv")
+    store.load()
+    for key in store.keys():
+        print(key, store.get(key).build())
+
+    preset = Preset("TX${counter:4}$1c${time:14}$1c${name:8}")
+    for i in range(3):
+        raw = preset.build(name="ABC")
+        print(raw, Comm.check(raw))
@@ -0,0 +1,102 @@
+import argparse
+import concurrent.futures
+import time
+
+from comm import Comm, CommError, FrameDecoder
+
+_SPEEDS = [115200, 57600, 38400, 19200, 9600]
+_STOPBITS = 2
+_WINDOW = 1.0
+_ENOUGH = 3
+
+
+class ProbeResult(object):
+    # a receiver only checks the first stop bit, so 1 and 2 stop bits look the same from here;
+    # only the speed is detected
+    def __init__(self, port, speed):
+        self.port = port
+        self.speed = speed
+        self.frames = 0
+        self.errors = 0
+        self.bytes = 0
+        self.discarded = 0
+        self.elapsed = 0
+
+    def __repr__(self):
+        return (f"<ProbeResult {self.port} {self.speed}: "
+                f"{self.frames} frames, {self.errors} errors, {self.discarded}/{self.bytes}B skipped, "
+                f"score {self.score():.2f}>")
+
+    def score(self):
+        if self.elapsed <= 0:
+            return 0
+        return (self.frames - self.errors) / self.elapsed
+
+    def is_clean(self, enough=_ENOUGH):
+        return self.frames >= enough and self.errors == 0
+
+
+def sample(port, speed, window=_WINDOW, enough=_ENOUGH, poke=None, stopbits=_STOPBITS):
+    # stopbits only matters for the poke, 2 is accepted by peers expecting either
+    result = ProbeResult(port, speed)
+    decoder = FrameDecoder()
+    comm = Comm(port, speed, stopbits=stopbits)
+    try:
+        comm.open()
+        comm.ser.timeout = 0.05
+        if hasattr(comm.ser, "reset_input_buffer"):
+            comm.ser.reset_input_buffer()
+        if poke:
+            comm.send(poke)
+
+        start = time.monotonic()
+        while time.monotonic() - start < window:
+            raw = comm.ser.read(comm.ser.in_waiting or 1)
+            result.bytes += len(raw)
+            for item in decoder.feed(raw):
+                if isinstance(item, CommError):
+                    result.errors += 1
+                else:
+                    result.frames += 1
+            if result.is_clean(enough):
+                break
+        result.elapsed = time.monotonic() - start
+        result.discarded = decoder.discarded
+    finally:
+        comm.close()
+    return result
+
+
+def probe(port, speeds=_SPEEDS, window=_WINDOW, enough=_ENOUGH, poke=None, stopbits=_STOPBITS):
+    results = []
+    for speed in speeds:
+        result = sample(port, speed, window, enough, poke, stopbits)
+        results.append(result)
+        if result.is_clean(enough):
+            return result, results
+    results.sort(key=lambda result: result.score(), reverse=True)
+    best = results[0] if results and results[0].frames > results[0].errors else None
+    return best, results
+
+
+def probe_ports(ports, **kwargs):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(ports))) as pool:
+        futures = {port: pool.submit(probe, port, **kwargs) for port in ports}
+        return {port: future.result()[0] for port, future in futures.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="find the speed of a terminal from its traffic "
+                                                 "(stop bits cannot be told apart on receive)")
+    parser.add_argument("ports", nargs="*", help="ports to probe (default: all scanned ports)")
+    parser.add_argument("--speeds", type=int, nargs="+", default=_SPEEDS)
+    parser.add_argument("--stopbits", type=int, default=_STOPBITS, help="stop bits used to send --poke")
+    parser.add_argument("--window", type=float, default=_WINDOW, help="seconds to listen per candidate")
+    parser.add_argument("--poke", help="data to send at each candidate to make the peer talk")
+    args = parser.parse_args()
+
+    ports = args.ports or Comm.scan_ports()
+    poke = args.poke.encode() if args.poke else None
+    for port, best in probe_ports(ports, speeds=args.speeds, stopbits=args.stopbits,
+                                  window=args.window, poke=poke).items():
+        print(f"{port}: {best if best else 'no frames found'}")
@@ -0,0 +1,83 @@
+import argparse
+import time
+
+from comm import Comm, CommError
+from capture import CaptureReader
+
+_SPIN = 0.002
+
+
+class Replayer(object):
+    def __init__(self, comm, speed=1.0):
+        self.comm = comm
+        self.speed = speed
+
+    @staticmethod
+    def wait_until(target):
+        while True:
+            remaining = target - time.perf_counter()
+            if remaining <= 0:
+                return
+            if remaining > _SPIN:
+                time.sleep(remaining - _SPIN)
+
+    def run(self, records):
+        char = self.comm.char_time()
+        errors = []
+        first_ts = None
+        start = None
+        target = 0
+        line_free = 0
+
+        # target is when the last frame was due to start, in both modes
+        for record in records:
+            if start is None:
+                first_ts = record.ts
+                start = time.perf_counter()
+            elif self.speed > 0:
+                target = (record.ts - first_ts) / self.speed
+            else:
+                target = line_free
+            self.wait_until(start + target)
+
+            errors.append(time.perf_counter() - start - target)
+            self.comm.write(record.raw)
+            line_free = target + len(record.raw) * char
+
+        elapsed = time.perf_counter() - start if start is not None else 0
+        errors.sort()
+        count = len(errors)
+        return {
+            "frames": count,
+            "target": target,
+            "elapsed": elapsed,
+            "char_time": char,
+            "jitter_mean": sum(errors) / count if count else 0,
+            "jitter_p99": errors[min(count - 1, count * 99 // 100)] if count else 0,
+            "jitter_max": errors[-1] if count else 0,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="re-send the '>>' frames of a capture")
+    parser.add_argument("capture")
+    parser.add_argument("port")
+    parser.add_argument("--speed", type=int, default=38400)
+    parser.add_argument("--rate", type=float, default=1.0, help="time multiplier, 0 = as fast as the line allows")
+    parser.add_argument("--from-port", help="replay only frames sent to this port")
+    parser.add_argument("--start", type=float, help="first timestamp to replay")
+    parser.add_argument("--end", type=float, help="replay frames before this timestamp (exclusive)")
+    args = parser.parse_args()
+
+    comm = Comm(args.port, args.speed)
+    try:
+        comm.open()
+        with CaptureReader(args.capture) as reader:
+            records = reader.select(args.start, args.end, '>', args.from_port)
+            report = Replayer(comm, args.rate).run(records)
+        for key, val in report.items():
+            print(f"{key}: {val}")
+    except CommError as ex:
+        print(str(ex))
+    finally:
+        comm.close()
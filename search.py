@@ -0,0 +1,82 @@
+import array
+import binascii
+import bisect
+import itertools
+import re
+
+_ENCODING = "euc-kr"
+_BLOCK = 4096
+_MAX_RECORD = 4096
+
+
+class LogIndex(object):
+    # full blocks of record ids are joined into one blob the first time a search needs them,
+    # bytes.find then scans them at C speed; nothing is built until someone searches
+    def __init__(self, log, encoding=_ENCODING):
+        self.log = log
+        self.encoding = encoding
+        self.blocks = {}
+
+    def clear(self):
+        self.blocks = {}
+
+    def build(self, start, end):
+        # records over _MAX_RECORD stay out of the blob and are searched in place
+        first = self.log.first_id()
+        raws = []
+        large = []
+        for rid in range(start, end):
+            raw = self.log[rid - first].raw
+            if len(raw) > _MAX_RECORD:
+                large.append(rid)
+                raw = b''
+            raws.append(raw)
+        return start, b''.join(raws), array.array('I', itertools.accumulate(map(len, raws))), large
+
+    def blocks_in(self, first, total):
+        for number in [number for number in self.blocks if (number + 1) * _BLOCK <= first]:
+            del self.blocks[number]
+
+        for number in range(first // _BLOCK, (total + _BLOCK - 1) // _BLOCK):
+            start = max(first, number * _BLOCK)
+            end = (number + 1) * _BLOCK
+            if end > total:
+                yield self.build(start, total)
+                continue
+            block = self.blocks.get(number)
+            if block is None:
+                block = self.blocks[number] = self.build(start, end)
+            yield block
+
+    def find(self, pattern):
+        first = self.log.first_id()
+        if not pattern:
+            return list(range(len(self.log)))
+
+        out = []
+        for start, blob, ends, large in self.blocks_in(first, self.log.total):
+            hits = []
+            pos = blob.find(pattern)
+            while pos >= 0:
+                index = bisect.bisect_right(ends, pos)
+                if pos + len(pattern) <= ends[index]:
+                    hits.append(start + index - first)
+                    pos = blob.find(pattern, ends[index])
+                else:
+                    pos = blob.find(pattern, pos + 1)
+            for rid in large:
+                if pattern in self.log[rid - first].raw:
+                    hits.append(rid - first)
+            out.extend(sorted(hits) if large else hits)
+        return [index for index in out if index >= 0]
+
+    def find_regex(self, pattern):
+        regex = re.compile(pattern.encode(self.encoding) if isinstance(pattern, str) else pattern)
+        return [index for index, record in enumerate(self.log) if regex.search(record.raw)]
+
+    def search(self, query):
+        if query.startswith("re:"):
+            return self.find_regex(query[3:])
+        if query.startswith("hex:"):
+            return self.find(binascii.unhexlify(query[4:].replace(' ', '')))
+        return self.find(query.encode(self.encoding))
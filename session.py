@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import binascii
+import sys
+import time
+
+from comm import Comm, CommError
+from async_comm import AsyncComm
+from capture import CaptureWriter
+from metrics import Metrics
+
+
+class Session(object):
+    # AsyncComm counts into comm.metrics, so each port gets its own Metrics
+    def __init__(self, port, speed):
+        self.port = port
+        self.speed = speed
+        self.comm = AsyncComm(port, speed)
+        self.metrics = Metrics()
+        self.comm.comm.metrics = self.metrics
+
+
+class SessionManager(object):
+    def __init__(self, ports=None, speed=38400, speeds=None, capture=None):
+        if ports is None:
+            ports = Comm.scan_ports()
+        speeds = speeds or {}
+        self.sessions = {}
+        self.failed = {}
+        for port in ports:
+            try:
+                self.sessions[port] = Session(port, speeds.get(port, speed))
+            except Exception as ex:
+                self.failed[port] = str(ex)
+        self.capture = capture
+        self.frames = None
+        self.tasks = []
+        self.running = 0
+        self.started = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.frames.get()
+        if item is None:
+            self.frames.put_nowait(None)
+            raise StopAsyncIteration
+        return item
+
+    async def open(self):
+        self.frames = asyncio.Queue()
+        for port, session in list(self.sessions.items()):
+            try:
+                await session.comm.open()
+            except Exception as ex:
+                self.failed[port] = str(ex)
+                del self.sessions[port]
+
+        loop = asyncio.get_event_loop()
+        self.running = len(self.sessions)
+        self.tasks = [loop.create_task(self.run_session(session)) for session in self.sessions.values()]
+        self.started = time.monotonic()
+        if not self.sessions:
+            self.frames.put_nowait(None)
+
+    def close(self):
+        for session in self.sessions.values():
+            session.comm.close()
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.frames:
+            self.frames.put_nowait(None)
+
+    async def run_session(self, session):
+        try:
+            async for item in session.comm:
+                if self.capture:
+                    self.capture.write_item(session.port, item)
+                self.frames.put_nowait((session.port, item))
+        finally:
+            self.running -= 1
+            if self.running == 0:
+                self.frames.put_nowait(None)
+
+    async def write(self, port, raw):
+        session = self.sessions[port]
+        await session.comm.write(raw)
+        if self.capture:
+            self.capture.write(port, '>', raw)
+
+    async def send(self, port, dat):
+        await self.write(port, Comm.build(dat))
+
+    async def broadcast(self, dat):
+        raw = Comm.build(dat)
+        for port in self.sessions:
+            await self.write(port, raw)
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        out = {
+            "elapsed": elapsed,
+            "ports": len(self.sessions),
+            "frames_in": 0,
+            "bytes_in": 0,
+            "frames_out": 0,
+            "bytes_out": 0,
+            "errors": {},
+        }
+        for session in self.sessions.values():
+            metrics = session.metrics
+            out["frames_in"] += metrics.frames_in
+            out["bytes_in"] += metrics.bytes_in
+            out["frames_out"] += metrics.frames_out
+            out["bytes_out"] += metrics.bytes_out
+            for name, count in metrics.errors.items():
+                out["errors"][name] = out["errors"].get(name, 0) + count
+        out["frames_in_rate"] = out["frames_in"] / elapsed if elapsed else 0
+        out["bytes_in_rate"] = out["bytes_in"] / elapsed if elapsed else 0
+        return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="read frames from many ports at once")
+    parser.add_argument("ports", nargs="*", help="ports to open (default: all scanned ports)")
+    parser.add_argument("--speed", type=int, default=38400)
+    parser.add_argument("--stats", type=float, default=10, help="seconds between stats lines")
+    parser.add_argument("--capture", help="append all traffic to this capture file")
+    args = parser.parse_args()
+
+    async def main():
+        capture = CaptureWriter(args.capture) if args.capture else None
+        async with SessionManager(args.ports or None, args.speed, capture=capture) as manager:
+            for port, ex in manager.failed.items():
+                print(f"{port}: {ex}", file=sys.stderr)
+            for port, session in manager.sessions.items():
+                if session.comm.comm.peer_name:
+                    print(f"{port}: peer {session.comm.comm.peer_name}", file=sys.stderr)
+            if not manager.sessions:
+                if capture:
+                    capture.close()
+                return 1
+
+            async def dump_stats():
+                while True:
+                    await asyncio.sleep(args.stats)
+                    print(manager.stats())
+
+            task = asyncio.get_event_loop().create_task(dump_stats())
+            try:
+                async for port, item in manager:
+                    if isinstance(item, CommError):
+                        print(f"{port} <{str(item)[0]} {binascii.hexlify(item.raw or b'').decode().upper()}")
+                    else:
+                        print(f"{port} << {binascii.hexlify(item).decode().upper()}")
+            finally:
+                task.cancel()
+                if capture:
+                    capture.close()
+        return 0
+
+    try:
+        sys.exit(asyncio.get_event_loop().run_until_complete(main()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import csv
+import random
+import time
+
+from comm import Comm, CommError
+from async_comm import AsyncComm
+from metrics import Histogram
+from packet import PacketBuilder, PacketParser
+from preset import PresetStore, Preset
+
+_ENCODING = "euc-kr"
+_FS = [0x1c]
+_ERRORS = ("lrc", "truncate", "drop")
+
+
+class Rule(object):
+    # match is '*', '@offset:width=value' for a field or a $xx escaped byte pattern
+    def __init__(self, match, response, delay=0, error=None, fs=_FS, encoding=_ENCODING):
+        self.text = match
+        self.offset = None
+        self.width = None
+        self.fs = fs
+        if match == "*":
+            self.pattern = b''
+        elif match.startswith("@"):
+            where, _, value = match[1:].partition("=")
+            offset, _, width = where.partition(":")
+            self.offset = int(offset)
+            self.pattern = PacketBuilder().decode(value.encode(encoding)).build()
+            self.width = int(width) if width else len(self.pattern)
+        else:
+            self.pattern = PacketBuilder().decode(match.encode(encoding)).build()
+
+        self.response = response
+        self.delay = delay
+        self.error = None
+        self.error_rate = 0
+        if error:
+            name, _, rate = error.partition(":")
+            if name not in _ERRORS:
+                raise ValueError(f"unknown error: {error}")
+            self.error = name
+            self.error_rate = float(rate) if rate else 1.0
+        self.hits = 0
+
+    def match(self, dat):
+        if self.offset is None:
+            return self.pattern in dat
+        parser = PacketParser(dat, self.fs)
+        parser.pos = self.offset
+        return parser.parse(self.width) == self.pattern
+
+
+class Simulator(object):
+    def __init__(self, rules, preset=None, seed=None):
+        self.rules = rules
+        self.preset = preset
+        self.responses = {}
+        self.random = random.Random(seed)
+        self.frames = 0
+        self.replies = 0
+        self.unmatched = 0
+        self.injected = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.sessions = []
+
+    @staticmethod
+    def load(filename, preset=None, seed=None, fs=_FS, encoding=_ENCODING):
+        rules = []
+        with open(filename, 'r', encoding=encoding) as f:
+            reader = csv.reader(f, skipinitialspace=True)
+            for row in reader:
+                if not row or row[0].startswith("#"):
+                    continue
+                match, response, delay, error = (row + ["", "", "", ""])[:4]
+                rules.append(Rule(match, response, float(delay or 0) / 1000, error or None, fs, encoding))
+        return Simulator(rules, preset, seed)
+
+    def compile(self, response):
+        preset = self.responses.get(response)
+        if preset is None:
+            if self.preset and response in self.preset.keys():
+                preset = self.preset.get(response)
+            else:
+                preset = Preset(response)
+            self.responses[response] = preset
+        return preset
+
+    def respond(self, dat):
+        for rule in self.rules:
+            if rule.match(dat):
+                break
+        else:
+            self.unmatched += 1
+            return None
+
+        rule.hits += 1
+        if not rule.response:
+            return None
+        raw = self.compile(rule.response).build(request=dat)
+
+        if rule.error and self.random.random() < rule.error_rate:
+            self.injected += 1
+            if rule.error == "drop":
+                return None
+            if rule.error == "lrc":
+                raw = raw[:-1] + bytes([raw[-1] ^ 0xff])
+            elif rule.error == "truncate":
+                raw = raw[:self.random.randrange(1, len(raw))]
+        return raw, rule.delay
+
+    async def serve(self, comm):
+        loop = asyncio.get_event_loop()
+        async for item in comm:
+            if isinstance(item, CommError):
+                self.errors += 1
+                continue
+
+            start = time.perf_counter()
+            self.frames += 1
+            reply = self.respond(Comm.parse(item))
+            if reply is None:
+                continue
+
+            raw, delay = reply
+            self.replies += 1
+            if delay:
+                loop.call_later(delay, comm.write_nowait, raw)
+            else:
+                comm.write_nowait(raw)
+                self.latency.add(time.perf_counter() - start)
+
+    async def open(self, ports, speed=38400):
+        loop = asyncio.get_event_loop()
+        tasks = []
+        for port in ports:
+            comm = AsyncComm(port, speed)
+            await comm.open()
+            self.sessions.append(comm)
+            tasks.append(loop.create_task(self.serve(comm)))
+        return tasks
+
+    def close(self):
+        for comm in self.sessions:
+            comm.close()
+        self.sessions = []
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "replies": self.replies,
+            "unmatched": self.unmatched,
+            "injected": self.injected,
+            "errors": self.errors,
+            "latency": self.latency.summary(),
+            "hits": {rule.text: rule.hits for rule in self.rules},
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="answer frames on many ports from a rule file")
+    parser.add_argument("rules", help="csv of: match, response, delay ms, error[:rate]")
+    parser.add_argument("ports", nargs="*", help="ports to serve, pty:// opens a new pty")
+    parser.add_argument("--speed", type=int, default=38400)
+    parser.add_argument("--preset", default="main.csv", help="preset file for response names")
+    parser.add_argument("--pty", type=int, default=0, help="also serve this many new ptys")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stats", type=float, default=10, help="seconds between stats lines")
+    args = parser.parse_args()
+
+    store = PresetStore(args.preset)
+    try:
+        store.load()
+    except OSError as ex:
+        print(f"preset: {ex}")
+    simulator = Simulator.load(args.rules, store, args.seed)
+
+    async def main():
+        tasks = await simulator.open(args.ports + ["pty://"] * args.pty, args.speed)
+        for comm in simulator.sessions:
+            print(f"serving {getattr(comm.comm.ser, 'name', None) or comm.comm.ser.port}")
+        try:
+            while True:
+                await asyncio.sleep(args.stats)
+                print(simulator.stats())
+        finally:
+            for task in tasks:
+                task.cancel()
+            simulator.close()
+
+    try:
+        asyncio.get_event_loop().run_until_complete(main())
+    except KeyboardInterrupt:
+        pass
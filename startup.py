@@ -0,0 +1,31 @@
+import time
+
+_STARTED = time.perf_counter()
+
+
+class StartupTimer(object):
+    # foreground steps are timed back to back, background jobs report their own durations
+    def __init__(self, started=_STARTED):
+        self.started = started
+        self.last = started
+        self.steps = []
+        self.jobs = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def measure(self, name, elapsed):
+        self.jobs.append((name, elapsed))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def format(self):
+        steps = ", ".join(f"{name} {elapsed * 1000:.1f}ms" for name, elapsed in self.steps)
+        jobs = ", ".join(f"{name} {elapsed * 1000:.1f}ms" for name, elapsed in self.jobs)
+        return f"startup: {steps}; background: {jobs}; ready {self.elapsed() * 1000:.1f}ms"
+
+    def report(self):
+        print(self.format())
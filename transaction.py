@@ -0,0 +1,129 @@
+import binascii
+import collections
+import time
+
+from comm import Comm, CommError, CommTimeoutError, _TIMEOUT
+
+
+class Transaction(object):
+    def __init__(self, dat, timeout=_TIMEOUT, retries=0):
+        self.dat = dat
+        self.raw = Comm.build(dat)
+        self.timeout = timeout
+        self.retries = retries
+        self.attempts = 0
+        self.sent = None
+        self.deadline = None
+        self.reply = None
+        self.error = None
+        self.latency = None
+
+    def __repr__(self):
+        state = "OK" if self.reply is not None else str(self.error)
+        latency = f"{self.latency * 1000:.1f}ms" if self.latency is not None else "-"
+        return f"<Transaction {binascii.hexlify(self.dat).decode().upper()} {state} {latency} x{self.attempts}>"
+
+
+class TransactionEngine(object):
+    # a frame error carries no request, blame(inflight, ex) picks the transaction to charge it to:
+    # by default the oldest one in flight, return None to ignore the error
+    def __init__(self, comm, timeout=_TIMEOUT, retries=2, window=1, match=None, blame=None):
+        self.comm = comm
+        self.timeout = timeout
+        self.retries = retries
+        self.window = window
+        self.match = match if match else lambda dat, reply: True
+        self.blame = blame if blame else lambda inflight, ex: inflight[0]
+        self.unsolicited = []
+
+    def submit(self, tr):
+        tr.attempts += 1
+        tr.error = None
+        tr.sent = time.perf_counter()
+        tr.deadline = tr.sent + tr.timeout
+        self.comm.write(tr.raw)
+
+    def fail(self, tr, ex, pending, done):
+        tr.error = ex
+        if tr.attempts <= tr.retries:
+            pending.appendleft(tr)
+        else:
+            done.append(tr)
+
+    def run(self, trs, window=None):
+        window = window or self.window
+        pending = collections.deque(trs)
+        inflight = []
+        done = []
+
+        while pending or inflight:
+            while pending and len(inflight) < window:
+                tr = pending.popleft()
+                self.submit(tr)
+                inflight.append(tr)
+
+            now = time.perf_counter()
+            expired = [tr for tr in inflight if tr.deadline <= now]
+            for tr in expired:
+                inflight.remove(tr)
+                self.fail(tr, CommTimeoutError("Timeout Error", None), pending, done)
+            if expired:
+                continue
+
+            remaining = min(tr.deadline for tr in inflight) - now
+            try:
+                raw = self.comm.read(remaining, frame_deadline=time.monotonic() + remaining)
+            except CommTimeoutError:
+                continue
+            except CommError as ex:
+                tr = self.blame(inflight, ex)
+                if tr is not None:
+                    inflight.remove(tr)
+                    self.fail(tr, ex, pending, done)
+                continue
+
+            now = time.perf_counter()
+            reply = Comm.parse(raw)
+            for tr in inflight:
+                if self.match(tr.dat, reply):
+                    inflight.remove(tr)
+                    tr.reply = reply
+                    tr.latency = now - tr.sent
+                    if self.comm.metrics:
+                        self.comm.metrics.add_rtt(tr.latency)
+                    done.append(tr)
+                    break
+            else:
+                self.unsolicited.append(reply)
+
+        return done
+
+    def request(self, dat, timeout=None, retries=None):
+        tr = Transaction(dat,
+                         self.timeout if timeout is None else timeout,
+                         self.retries if retries is None else retries)
+        self.run([tr], 1)
+        if tr.error:
+            raise tr.error
+        return tr
+
+    def pipeline(self, dats, window=None, timeout=None, retries=None):
+        trs = [Transaction(dat,
+                           self.timeout if timeout is None else timeout,
+                           self.retries if retries is None else retries) for dat in dats]
+        self.run(trs, window)
+        return trs
+
+
+if __name__ == '__main__':
+    comm = Comm('/dev/pts/1', 38400)
+    try:
+        comm.open()
+        engine = TransactionEngine(comm, timeout=1, retries=2, window=4)
+        print(engine.request(b'test message #1'))
+        for tr in engine.pipeline([b'test message #%d' % i for i in range(8)]):
+            print(tr)
+    except CommError as ex:
+        print(str(ex))
+    finally:
+        comm.close()
@@ -0,0 +1,236 @@
+import collections
+import math
+import os
+import random
+import select
+import socket
+import threading
+import time
+import urllib.parse
+
+_LOOP_OPTIONS = ("latency", "bandwidth", "error_rate", "seed")
+
+
+class Transport(object):
+    def __init__(self, speed=38400):
+        self.is_open = False
+        self.timeout = None
+        self.baudrate = speed
+        self.bytesize = 8
+        self.stopbits = 2
+        self.parity = 'N'
+        self.rx = bytearray()
+
+    def __del__(self):
+        self.close()
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def flush(self):
+        pass
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    @property
+    def in_waiting(self):
+        self.poll(0)
+        return len(self.rx)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(self.rx) < size:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not self.poll(remaining) or remaining == 0:
+                break
+        dat = bytes(self.rx[:size])
+        del self.rx[:size]
+        return dat
+
+    def poll(self, timeout):
+        raise NotImplementedError
+
+
+class FdTransport(Transport):
+    def fileno(self):
+        raise NotImplementedError
+
+    def recv(self):
+        raise NotImplementedError
+
+    def poll(self, timeout):
+        ready, _, _ = select.select([self.fileno()], [], [], timeout)
+        if not ready:
+            return False
+        dat = self.recv()
+        if not dat:
+            raise OSError("connection closed")
+        self.rx += dat
+        return True
+
+
+class SocketTransport(FdTransport):
+    def __init__(self, host, port, speed=38400):
+        super().__init__(speed)
+        self.address = (host, port)
+        self.sock = None
+
+    def open(self):
+        if not self.is_open:
+            self.sock = socket.create_connection(self.address)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.sock.close()
+            self.sock = None
+            self.is_open = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self):
+        return self.sock.recv(65536)
+
+    def write(self, dat):
+        self.sock.sendall(dat)
+        return len(dat)
+
+
+class PtyTransport(FdTransport):
+    # the master side of a new pty; a Comm can open `name` as the peer
+    def __init__(self, speed=38400):
+        super().__init__(speed)
+        self.master = None
+        self.slave = None
+        self.name = None
+        self.open()
+
+    def open(self):
+        if not self.is_open:
+            self.master, self.slave = os.openpty()
+            self.name = os.ttyname(self.slave)
+            self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            os.close(self.slave)
+            os.close(self.master)
+            self.is_open = False
+
+    def fileno(self):
+        return self.master
+
+    def recv(self):
+        return os.read(self.master, 65536)
+
+    def write(self, dat):
+        view = memoryview(dat)
+        while view:
+            view = view[os.write(self.master, view):]
+        return len(dat)
+
+
+class LoopbackTransport(Transport):
+    def __init__(self, speed=38400, latency=0, bandwidth=None, error_rate=0, seed=None):
+        super().__init__(speed)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.peer = None
+        self.incoming = collections.deque()
+        self.cond = threading.Condition()
+        self.busy_until = 0
+        self.errors = 0
+
+    @staticmethod
+    def pair(**kwargs):
+        a = LoopbackTransport(**kwargs)
+        b = LoopbackTransport(**kwargs)
+        a.peer = b
+        b.peer = a
+        return a, b
+
+    def fileno(self):
+        raise OSError("loopback has no file descriptor")
+
+    @property
+    def out_waiting(self):
+        if not self.bandwidth:
+            return 0
+        return int(max(0, self.busy_until - time.monotonic()) * self.bandwidth)
+
+    def corrupt(self, dat):
+        dat = bytearray(dat)
+        scale = math.log(1 - self.error_rate) if self.error_rate < 1 else None
+        pos = -1
+        while True:
+            pos += 1 if scale is None else int(math.log(1 - self.random.random()) / scale) + 1
+            if pos >= len(dat):
+                break
+            dat[pos] ^= self.random.randrange(1, 256)
+            self.errors += 1
+        return bytes(dat)
+
+    def write(self, dat):
+        if self.error_rate > 0:
+            dat = self.corrupt(dat)
+        now = time.monotonic()
+        start = max(now, self.busy_until)
+        if self.bandwidth:
+            self.busy_until = start + len(dat) / self.bandwidth
+        else:
+            self.busy_until = start
+
+        peer = self.peer
+        with peer.cond:
+            peer.incoming.append((self.busy_until + self.latency, bytes(dat)))
+            peer.cond.notify_all()
+        return len(dat)
+
+    def poll(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                moved = False
+                while self.incoming and self.incoming[0][0] <= now:
+                    self.rx += self.incoming.popleft()[1]
+                    moved = True
+                if moved or timeout == 0:
+                    return moved
+
+                wait = None if deadline is None else deadline - now
+                if self.incoming:
+                    due = self.incoming[0][0] - now
+                    wait = due if wait is None else min(wait, due)
+                if wait is not None and wait <= 0:
+                    return False
+                self.cond.wait(wait)
+
+
+def open_transport(url, speed=38400):
+    scheme, _, rest = url.partition("://")
+    if scheme in ("socket", "tcp"):
+        host, _, port = rest.rpartition(":")
+        return SocketTransport(host, int(port), speed)
+    if scheme == "pty":
+        return PtyTransport(speed)
+    if scheme == "loop":
+        # one loopback echoing what is written to it, e.g. loop://?latency=0.01&bandwidth=3840
+        options = {}
+        for key, val in urllib.parse.parse_qsl(rest.lstrip("?")):
+            if key not in _LOOP_OPTIONS:
+                raise ValueError(f"unknown loop option: {key}")
+            options[key] = int(val) if key == "seed" else float(val)
+        transport = LoopbackTransport(speed, **options)
+        transport.peer = transport
+        return transport
+    raise ValueError(f"unknown transport: {url}")
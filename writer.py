@@ -0,0 +1,218 @@
+import argparse
+import collections
+import itertools
+import threading
+import time
+
+from comm import Comm, CommBusyError, CommClosedError
+from metrics import Histogram
+
+_QUEUE_SIZE = 256
+_BATCH_SIZE = 4096
+_LINGER = 0
+_POLL = 0.0005
+
+
+class WriteRequest(object):
+    __slots__ = ("raw", "queued", "written", "sent")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.queued = time.perf_counter()
+        self.written = None
+        self.sent = None
+
+    @property
+    def done(self):
+        return self.sent is not None
+
+    @property
+    def latency(self):
+        return None if self.sent is None else self.sent - self.queued
+
+
+class Writer(object):
+    # single writer thread: frames queued while the line is busy go out as one write
+    def __init__(self, comm, size=_QUEUE_SIZE, batch=_BATCH_SIZE, linger=_LINGER, on_sent=None):
+        self.comm = comm
+        self.size = size
+        self.batch = batch
+        self.linger = linger
+        self.on_sent = on_sent
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.inflight = 0
+        self.writes = 0
+        self.frames = 0
+        self.rejected = 0
+        self.peak = 0
+        self.latency = Histogram()
+        self.error = None
+        self.running = False
+        self.thread = None
+
+    def __len__(self):
+        return len(self.queue)
+
+    def start(self):
+        if self.thread:
+            return
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        if not self.thread:
+            return
+        self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join()
+        self.thread = None
+
+    def put(self, raw):
+        with self.cond:
+            if not self.running:
+                raise CommClosedError("writer stopped", raw)
+            if len(self.queue) >= self.size:
+                self.rejected += 1
+                raise CommBusyError(f"write queue full ({self.size})", raw)
+            request = WriteRequest(raw)
+            self.queue.append(request)
+            self.peak = max(self.peak, len(self.queue))
+            self.cond.notify_all()
+        return request
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.running and (self.queue or self.inflight):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return not self.queue
+
+    def take(self):
+        with self.cond:
+            while self.running and not self.queue:
+                self.cond.wait()
+            if not self.running:
+                return []
+
+            if self.linger and sum(len(request.raw) for request in self.queue) < self.batch:
+                self.cond.wait(self.linger)
+
+            requests = [self.queue.popleft()]
+            size = len(requests[0].raw)
+            while self.queue and size + len(self.queue[0].raw) <= self.batch:
+                request = self.queue.popleft()
+                requests.append(request)
+                size += len(request.raw)
+            self.inflight = len(requests)
+            return requests
+
+    def drain(self, requests, size):
+        ser = self.comm.ser
+        try:
+            ser.out_waiting
+        except (AttributeError, NotImplementedError, OSError):
+            ser.flush()
+            self.complete(requests)
+            return
+
+        # bytes leave in order, so out_waiting tells how far into the batch the line is
+        ends = list(itertools.accumulate(len(request.raw) for request in requests))
+        deadline = time.perf_counter() + size * self.comm.char_time() * 2 + 0.1
+        index = 0
+        while True:
+            sent = size - ser.out_waiting
+            count = index
+            while count < len(requests) and ends[count] <= sent:
+                count += 1
+            self.complete(requests[index:count])
+            index = count
+            if index == len(requests):
+                return
+            if time.perf_counter() > deadline:
+                ser.flush()
+                self.complete(requests[index:])
+                return
+            time.sleep(_POLL)
+
+    def complete(self, requests):
+        now = time.perf_counter()
+        for request in requests:
+            request.sent = now
+            self.latency.add(request.latency)
+            if self.comm.metrics:
+                self.comm.metrics.add_tx(request.latency)
+            if self.on_sent:
+                self.on_sent(request)
+
+    def run(self):
+        while self.running:
+            requests = self.take()
+            if not requests:
+                continue
+
+            raw = b"".join(request.raw for request in requests)
+            try:
+                self.comm.ser.write(raw)
+                now = time.perf_counter()
+                for request in requests:
+                    request.written = now
+                    if self.comm.metrics:
+                        self.comm.metrics.count_out(request.raw)
+                self.writes += 1
+                self.frames += len(requests)
+                self.drain(requests, len(raw))
+            except Exception as ex:
+                print(f"Writer.run: {ex}")
+                self.error = ex
+                with self.cond:
+                    self.running = False
+
+            with self.cond:
+                self.inflight = 0
+                self.cond.notify_all()
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "writes": self.writes,
+            "coalesced": self.frames - self.writes,
+            "rejected": self.rejected,
+            "peak": self.peak,
+            "latency": self.latency.summary(),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port")
+    parser.add_argument("-s", "--speed", type=int, default=38400)
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("-b", "--size", type=int, default=16)
+    parser.add_argument("--linger", type=float, default=_LINGER)
+    args = parser.parse_args()
+
+    comm = Comm(args.port, args.speed)
+    comm.open()
+    writer = Writer(comm, linger=args.linger)
+    writer.start()
+
+    dat = Comm.build(bytes(range(0x30, 0x30 + args.size)))
+    for n in range(args.count):
+        try:
+            writer.put(dat)
+        except CommBusyError:
+            writer.flush()
+            writer.put(dat)
+    writer.stop(timeout=None)
+
+    for key, val in writer.stats().items():
+        print(f"{key}: {val}")
+    comm.close()